@@ -1,8 +1,15 @@
 from django.contrib import admin
-from .models import Profile
+from .models import Profile, ReportJob
 
 # Добавление профиля в админку
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'photo']
-    raw_id_fields = ['user']
\ No newline at end of file
+    raw_id_fields = ['user']
+
+# Очередь PDF-отчетов
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'kind', 'employee', 'status', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind']
+    raw_id_fields = ['user', 'employee']
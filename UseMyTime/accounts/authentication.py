@@ -1,19 +1,48 @@
+from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth.models import User
+from django.db.models import Case, Q, Value, When
 
 
-class EmailAuthBackend:
-    # Добавление входа по почте
-    def authenticate(self, request, username=None, password=None):
-        try:
-            user = User.objects.get(email=username)
-            if user.check_password(password):
-                return user
+# Вход по логину или по почте (почта без учета регистра)
+# Пользователь ищется одним запросом по уникальному логину и индексу почты (миграция 0011_auth_user_email_iexact_index),
+# пароль проверяется ровно один раз: при неизвестном логине хэш все равно вычисляется,
+# чтобы по времени ответа нельзя было узнать, существует ли пользователь
+class UsernameOrEmailBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
             return None
-        except (User.DoesNotExist, User.MultipleObjectsReturned):
+        user = self.find_user(username)
+        if user is None:
+            User().set_password(password)
             return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    # Совпадение по логину важнее совпадения по почте;
+    # если почта указана у нескольких пользователей, вход по ней невозможен
+    # Совпадение по логину идет первым, поэтому двух строк достаточно: без него вторая строка
+    # означает неоднозначную почту
+    def find_user(self, username):
+        by_username, by_email = None, []
+        users = User.objects.filter(Q(username=username) | Q(email__iexact=username))\
+                            .order_by(Case(When(username=username, then=Value(0)), default=Value(1)), 'pk')
+        for user in users[:2]:
+            if user.username == username:
+                by_username = user
+            else:
+                by_email.append(user)
+        if by_username is not None:
+            return by_username
+        return by_email[0] if len(by_email) == 1 else None
 
+    # Пользователь сессии загружается одним запросом вместе с профилем (проверка роли, шапка и меню страницы)
+    # и активным проектом (панель таймера); объект пользователя живет до конца запроса
     def get_user(self, user_id):
         try:
-            return User.objects.get(pk=user_id)
+            user = User.objects.select_related('profile', 'active_project__project').get(pk=user_id)
         except User.DoesNotExist:
-            return None
\ No newline at end of file
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,99 @@
+import csv
+from datetime import timedelta
+from itertools import islice
+from urllib.parse import quote
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Max, Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from projects.models import Project, Task
+from .reports import period_filters
+
+# Выполненные задачи читаются из базы порциями, в памяти не держится вся выгрузка
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_HEADER = ['Фамилия', 'Имя', 'Отчество', 'Должность', 'Проект', 'Задача',
+                 'Дата создания проекта', 'Дата завершения', 'Затрачено времени']
+
+
+# Псевдофайл для csv.writer: строка возвращается сразу, а не пишется в буфер
+class Echo:
+    def write(self, value):
+        return value
+
+
+def format_duration(duration):
+    seconds = int(duration.total_seconds())
+    return f'{seconds // 3600}:{(seconds % 3600) // 60:02}:{seconds % 60:02}'
+
+
+def format_date(value):
+    return timezone.localtime(value).strftime('%d.%m.%Y') if value else ''
+
+
+# Строки выгрузки: по одной на каждую выполненную задачу неархивных проектов сотрудников
+# Итоги проектов (время и дата завершения) считаются одним запросом по проектам,
+# задачи идут потоком через iterator(); за период - только задачи и время периода
+def report_rows(user_ids, period=None):
+    done = Q(tasks__is_done=True, **period_filters(period, 'tasks__created_at', moments=True))
+    projects = {pk: (total_time, completed_at)
+                for pk, total_time, completed_at in Project.objects.filter(user_id__in=user_ids, is_archived=False)
+                                                                   .with_total_time(**period_filters(period, 'day'))
+                                                                   .annotate(completed_at=Max('tasks__created_at',
+                                                                                              filter=done))
+                                                                   .values_list('pk', 'total_time', 'completed_at')}
+    tasks = Task.objects.filter(project__user_id__in=user_ids, project__is_archived=False, is_done=True,
+                                **period_filters(period, 'created_at', moments=True))\
+                        .order_by('project__user__last_name', 'project__user_id', 'project_id', 'pk')\
+                        .values_list('project_id',
+                                     'project__user__last_name',
+                                     'project__user__first_name',
+                                     'project__user__profile__surname',
+                                     'project__user__profile__position',
+                                     'project__title',
+                                     'project__created_at',
+                                     'text')
+    yield EXPORT_HEADER
+    for project_id, last_name, first_name, surname, position, title, created_at, text in \
+            tasks.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        total_time, completed_at = projects.get(project_id, (timedelta(0), None))
+        yield [last_name, first_name, surname or '', position or '', title, text,
+               format_date(created_at), format_date(completed_at), format_duration(total_time)]
+
+
+# Начальные символы, с которых Excel и LibreOffice считают ячейку формулой
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+# Защита от внедрения формул (CSV injection): названия проектов и тексты задач вводят пользователи,
+# и ячейка вида =HYPERLINK(...) выполнилась бы при открытии выгрузки; апостроф делает ее текстом
+def escape_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+# Строки CSV для Excel: BOM для распознавания UTF-8 и разделитель ";"
+def csv_lines(rows):
+    writer = csv.writer(Echo(), delimiter=';')
+    yield '\ufeff'
+    for row in rows:
+        yield writer.writerow([escape_cell(value) for value in row])
+
+
+# Под ASGI синхронный итератор был бы целиком собран в память перед отправкой,
+# поэтому строки читаются порциями в потоке через sync_to_async
+async def async_chunks(lines):
+    next_chunk = sync_to_async(lambda: ''.join(islice(lines, EXPORT_CHUNK_SIZE)))
+    while chunk := await next_chunk():
+        yield chunk
+
+
+# Потоковая выгрузка в CSV
+def csv_response(request, rows, filename):
+    lines = csv_lines(rows)
+    content = async_chunks(lines) if isinstance(request, ASGIRequest) else lines
+    response = StreamingHttpResponse(content, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+    return response
@@ -34,7 +34,7 @@ class UserRegistrationForm(forms.ModelForm):
     # Проверка уникальности почты
     def clean_email(self):
         data = self.cleaned_data['email']
-        if User.objects.filter(email=data).exists():
+        if User.objects.filter(email__iexact=data).exists():
             raise forms.ValidationError('Эта почта занята')
         return data
 
@@ -48,7 +48,7 @@ class UserEditForm(forms.ModelForm):
     def clean_email(self):
         data = self.cleaned_data['email']
         qs = User.objects.exclude(id=self.instance.id)\
-                         .filter(email=data)
+                         .filter(email__iexact=data)
         if qs.exists():
             raise forms.ValidationError('Эта почта занята')
         return data
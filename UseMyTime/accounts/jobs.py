@@ -0,0 +1,94 @@
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from .models import ReportJob, get_report_storage
+from .pdf import render_pdf
+from .reports import employee_report_context, team_report_context
+
+
+# Постановка отчета в очередь
+# Если такой же отчет пользователя по той же версии данных уже готов, в очереди или формируется,
+# возвращается существующая задача, и отчет не формируется повторно
+def enqueue_report(user, kind, employee=None, base_url='', data_token='', period=None):
+    date_from, date_to = period or (None, None)
+    same_report = ReportJob.objects.filter(user=user, kind=kind, employee=employee,
+                                           date_from=date_from, date_to=date_to)
+    job = same_report.filter(status__in=['pending', 'running']).first()
+    if job is None:
+        job = same_report.filter(status='done', data_token=data_token)\
+                         .exclude(data_token='').order_by('-finished_at').first()
+    if job is None:
+        job = ReportJob.objects.create(user=user, kind=kind, employee=employee, date_from=date_from,
+                                       date_to=date_to, base_url=base_url, data_token=data_token)
+    return job
+
+
+# Захват самой старой задачи из очереди
+# Статус меняется условным UPDATE, поэтому одну задачу не возьмут два обработчика одновременно
+def claim_next_job():
+    for job in ReportJob.objects.filter(status='pending').order_by('created_at')[:10]:
+        if ReportJob.objects.filter(pk=job.pk, status='pending').update(status='running',
+                                                                        started_at=timezone.now()):
+            job.status = 'running'
+            return job
+    return None
+
+
+# Возврат в очередь задач, зависших в статусе "формируется" (например, обработчик был остановлен)
+def requeue_stale_jobs(older_than):
+    return ReportJob.objects.filter(status='running', started_at__lt=timezone.now() - older_than)\
+                            .update(status='pending', started_at=None)
+
+
+# Удаление завершенных задач (готовых и с ошибкой) старше older_than вместе с файлами отчетов
+# Сначала удаляются строки: файл без строки задачи уже никому не выдается, обратное дало бы ссылку на пустоту
+def delete_expired_jobs(older_than, batch_size=500):
+    expired = ReportJob.objects.filter(status__in=['done', 'failed'], finished_at__lt=timezone.now() - older_than)\
+                               .order_by('pk')
+    deleted = 0
+    while batch := list(expired.values_list('pk', 'file')[:batch_size]):
+        deleted += ReportJob.objects.filter(pk__in=[pk for pk, _ in batch]).delete()[0]
+        storage = get_report_storage()
+        for _, name in batch:
+            if name:
+                storage.delete(name)
+    return deleted
+
+
+def report_filename(job):
+    if job.kind == 'team':
+        last_name = job.user.last_name
+    else:
+        last_name = job.employee.user.last_name
+    return f'отчет_{last_name}_{job.created_at.strftime("%Y%m%d")}.pdf'
+
+
+def render_report_pdf(job):
+    period = (job.date_from, job.date_to) if job.date_from or job.date_to else None
+    if job.kind == 'team':
+        html_string = render_to_string('accounts/team_report.html',
+                                       {**team_report_context(job.user.profile, job.created_at, period),
+                                        'pdf': True})
+    else:
+        html_string = render_to_string('accounts/employee_report.html',
+                                       {**employee_report_context(job.employee, job.created_at, period),
+                                        'pdf': True})
+    return render_pdf(html_string, job.base_url)
+
+
+# Формирование отчета задачи, ошибка сохраняется в задаче и не останавливает обработчик
+def run_job(job):
+    try:
+        pdf = render_report_pdf(job)
+    except Exception as error:
+        ReportJob.objects.filter(pk=job.pk).update(status='failed', error=str(error),
+                                                   finished_at=timezone.now())
+        job.status = 'failed'
+        return job
+    with transaction.atomic():
+        job.file.save(report_filename(job), ContentFile(pdf), save=False)
+        job.status = 'done'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['file', 'status', 'finished_at'])
+    return job
@@ -0,0 +1,63 @@
+import statistics
+import time
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts.authentication import UsernameOrEmailBackend
+
+BENCHMARK_USERNAME = 'benchmark-login'
+BENCHMARK_EMAIL = 'Benchmark.Login@example.com'
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+
+# Прежний способ: сначала ModelBackend (при входе по почте промах и проверка пароля "вхолостую"),
+# затем поиск по почте с учетом регистра и вторая проверка пароля
+def authenticate_before(username, password):
+    user = ModelBackend().authenticate(None, username=username, password=password)
+    if user is not None:
+        return user
+    try:
+        user = User.objects.get(email=username)
+    except (User.DoesNotExist, User.MultipleObjectsReturned):
+        return None
+    return user if user.check_password(password) else None
+
+
+def authenticate_after(username, password):
+    return UsernameOrEmailBackend().authenticate(None, username=username, password=password)
+
+
+def measure(authenticate, username, password, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        authenticate(username, password)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+# Замер пропускной способности входа (входов в секунду на один процесс)
+# Временный пользователь создается в транзакции, которая в конце откатывается
+class Command(BaseCommand):
+    help = 'Измеряет скорость входа по логину и по почте до и после объединения способов входа'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10,
+                            help='Количество повторов для каждого случая (берется медиана)')
+
+    def handle(self, *args, **options):
+        cases = {
+            'по логину': (BENCHMARK_USERNAME, BENCHMARK_PASSWORD),
+            'по почте': (BENCHMARK_EMAIL, BENCHMARK_PASSWORD),
+            'неверный пароль': (BENCHMARK_EMAIL, 'wrong-password'),
+            'неизвестный логин': ('nobody@example.com', BENCHMARK_PASSWORD),
+        }
+        with transaction.atomic():
+            User.objects.create_user(BENCHMARK_USERNAME, BENCHMARK_EMAIL, BENCHMARK_PASSWORD)
+            self.stdout.write(f'{"случай":>18} {"до, вход/с":>12} {"после, вход/с":>14}')
+            for name, (username, password) in cases.items():
+                before = measure(authenticate_before, username, password, options['repeat'])
+                after = measure(authenticate_after, username, password, options['repeat'])
+                self.stdout.write(f'{name:>18} {1 / before:>12.1f} {1 / after:>14.1f}')
+            transaction.set_rollback(True)
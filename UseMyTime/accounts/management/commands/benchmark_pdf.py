@@ -0,0 +1,73 @@
+import statistics
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils import timezone
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+from accounts.pdf import REPORT_STYLESHEET, local_url_fetcher, render_pdf, warm_up
+
+TASKS_PER_PROJECT = 10
+
+
+# Разметка отчета по сотруднику с заданным числом задач (без обращения к базе)
+def build_report_html(tasks_count):
+    now = timezone.now()
+    employee = SimpleNamespace(user=SimpleNamespace(last_name='Иванов', first_name='Иван'),
+                               surname='Иванович', position='Инженер')
+    report_data = []
+    for start in range(0, tasks_count, TASKS_PER_PROJECT):
+        report_data.append({
+            'project': SimpleNamespace(title=f'Проект {start // TASKS_PER_PROJECT + 1}'),
+            'tasks': [SimpleNamespace(text=f'Задача {number + 1}')
+                      for number in range(start, min(start + TASKS_PER_PROJECT, tasks_count))],
+            'hours': 12, 'minutes': 34, 'seconds': 56,
+            'created_at': datetime(2025, 1, 1), 'completed_at': now,
+        })
+    return render_to_string('accounts/employee_report.html', {
+        'employee': employee, 'report_data': report_data, 'total_tasks': tasks_count,
+        'total_hours': 100, 'total_minutes': 0, 'total_seconds': 0,
+        'week_hours': 40, 'week_minutes': 0, 'now': now, 'pdf': True,
+    })
+
+
+# Прежний способ: шрифты и стили настраиваются заново для каждого отчета
+def render_pdf_fresh(html_string):
+    font_config = FontConfiguration()
+    stylesheet = CSS(filename=finders.find(REPORT_STYLESHEET), font_config=font_config)
+    return HTML(string=html_string, url_fetcher=local_url_fetcher).write_pdf(stylesheets=[stylesheet],
+                                                                            font_config=font_config)
+
+
+def measure(render, html_string, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render(html_string)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+# Замер времени формирования PDF для отчетов разного размера
+class Command(BaseCommand):
+    help = 'Измеряет время формирования PDF-отчета для 10, 100 и 1000 задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000],
+                            help='Количество задач в отчете')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Количество повторов для каждого размера (берется медиана)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        warm_up()
+        self.stdout.write(f'Прогрев (шрифты и стили): {(time.perf_counter() - started) * 1000:.0f} мс')
+        self.stdout.write(f'{"задач":>6} {"заново, мс":>12} {"прогретый, мс":>14}')
+        for size in options['sizes']:
+            html_string = build_report_html(size)
+            fresh = measure(render_pdf_fresh, html_string, options['repeat'])
+            warm = measure(render_pdf, html_string, options['repeat'])
+            self.stdout.write(f'{size:>6} {fresh:>12.0f} {warm:>14.0f}')
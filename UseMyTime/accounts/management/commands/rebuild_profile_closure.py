@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from accounts.models import ProfileClosure
+
+
+# Полный пересчет таблицы замыкания иерархии по полю Profile.manager
+class Command(BaseCommand):
+    help = 'Пересчитывает иерархию подчинения (ProfileClosure) по начальникам сотрудников'
+
+    def handle(self, *args, **options):
+        count = ProfileClosure.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитана иерархия для профилей: {count}'))
@@ -0,0 +1,56 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from accounts.jobs import claim_next_job, delete_expired_jobs, requeue_stale_jobs, run_job
+from accounts.pdf import warm_up
+from metrics import flush as flush_metrics
+
+# Как часто обработчик удаляет устаревшие отчеты, секунд
+CLEANUP_INTERVAL = 60 * 60
+
+
+# Обработчик очереди PDF-отчетов
+# Запускается отдельным процессом рядом с веб-сервером, чтобы формирование PDF не занимало веб-воркеры
+class Command(BaseCommand):
+    help = 'Формирует PDF-отчеты из очереди (ReportJob)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Обработать очередь и завершиться')
+        parser.add_argument('--sleep', type=float, default=2,
+                            help='Пауза между проверками пустой очереди, секунд')
+        parser.add_argument('--stale-after', type=int, default=15,
+                            help='Через сколько минут задача в статусе "формируется" считается зависшей')
+        parser.add_argument('--keep-days', type=int, default=7,
+                            help='Сколько дней хранятся завершенные задачи и файлы отчетов')
+
+    # Готовые отчеты не копятся в REPORTS_ROOT: завершенные задачи старше --keep-days удаляются
+    # при запуске и затем раз в CLEANUP_INTERVAL
+    def delete_expired(self, options):
+        deleted = delete_expired_jobs(timedelta(days=options['keep_days']))
+        if deleted:
+            self.stdout.write(f'Удалено устаревших отчетов: {deleted}')
+        return time.monotonic()
+
+    def handle(self, *args, **options):
+        warm_up()
+        requeued = requeue_stale_jobs(timedelta(minutes=options['stale_after']))
+        if requeued:
+            self.stdout.write(f'Возвращено в очередь зависших задач: {requeued}')
+        cleaned_at = self.delete_expired(options)
+        while True:
+            if time.monotonic() - cleaned_at >= CLEANUP_INTERVAL:
+                cleaned_at = self.delete_expired(options)
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            job = run_job(job)
+            # Время формирования PDF попадает в метрики веб-сервера через файл процесса (METRICS_DIR)
+            flush_metrics(force=True)
+            if job.status == 'done':
+                self.stdout.write(self.style.SUCCESS(f'Отчет {job.pk} готов'))
+            else:
+                self.stdout.write(self.style.ERROR(f'Отчет {job.pk}: ошибка'))
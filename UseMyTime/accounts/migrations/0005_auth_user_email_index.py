@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:42
+
+from django.db import migrations
+
+
+# Вход по почте (EmailAuthBackend) ищет пользователя по auth_user.email,
+# модель пользователя встроенная, поэтому индекс создается напрямую
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_profile_first_name_profile_last_name_profile_manager_and_more'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX accounts_auth_user_email_idx ON auth_user (email);',
+            'DROP INDEX accounts_auth_user_email_idx;',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_report_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='data_token',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Копия accounts.models.closure_rows на момент миграции: миграция не должна зависеть от текущего кода моделей
+def closure_rows(managers):
+    for profile_id in managers:
+        depth, ancestor_id, seen = 0, profile_id, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            yield ancestor_id, profile_id, depth
+            depth, ancestor_id = depth + 1, managers.get(ancestor_id)
+
+
+# Заполнение таблицы замыкания по текущим начальникам сотрудников
+def fill_profile_closure(apps, schema_editor):
+    Profile = apps.get_model('accounts', 'Profile')
+    ProfileClosure = apps.get_model('accounts', 'ProfileClosure')
+    managers = dict(Profile.objects.values_list('pk', 'manager_id'))
+    ProfileClosure.objects.bulk_create([ProfileClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth)
+                                        for ancestor_id, descendant_id, depth in closure_rows(managers)],
+                                       batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_report_job_data_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='accounts.profile')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='accounts.profile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='accounts_pr_descend_ce0a8f_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='profile_closure_unique_pair')],
+            },
+        ),
+        migrations.RunPython(fill_profile_closure, migrations.RunPython.noop),
+    ]
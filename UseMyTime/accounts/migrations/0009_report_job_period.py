@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_profile_closure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='date_from',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reportjob',
+            name='date_to',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
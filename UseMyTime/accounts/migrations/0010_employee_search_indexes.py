@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:05
+
+from django.db import migrations
+
+# Поиск сотрудника на странице отдела: совпадение по началу фамилии, имени или должности без учета регистра
+# Django строит такой поиск (istartswith) по-разному, поэтому и индексы для каждой базы свои:
+# PostgreSQL - UPPER(поле::text) LIKE UPPER('...%'), нужен индекс по выражению с text_pattern_ops;
+# SQLite - поле LIKE '...%', который использует индекс с правилом сравнения NOCASE
+SEARCH_INDEXES = (
+    ('accounts_auth_user_last_name_search_idx', 'auth_user', 'last_name'),
+    ('accounts_auth_user_first_name_search_idx', 'auth_user', 'first_name'),
+    ('accounts_profile_position_search_idx', 'accounts_profile', 'position'),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for name, table, column in SEARCH_INDEXES:
+        if vendor == 'postgresql':
+            schema_editor.execute(f'CREATE INDEX {name} ON {table} (UPPER({column}::text) text_pattern_ops);')
+        elif vendor == 'sqlite':
+            schema_editor.execute(f'CREATE INDEX {name} ON {table} ({column} COLLATE NOCASE);')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        for name, table, column in SEARCH_INDEXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {name};')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_report_job_period'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
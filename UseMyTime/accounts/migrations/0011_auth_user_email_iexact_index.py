@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:12
+
+from django.db import migrations
+
+# Вход по почте ищет пользователя без учета регистра (email__iexact), поэтому прежний индекс
+# по auth_user.email заменяется индексом под SQL, который Django строит для каждой базы:
+# PostgreSQL - UPPER(email::text) = UPPER('...'), SQLite - email LIKE '...' (индекс с NOCASE)
+INDEX_NAME = 'accounts_auth_user_email_iexact_idx'
+
+
+def create_email_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'CREATE INDEX {INDEX_NAME} ON auth_user (UPPER(email::text));')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'CREATE INDEX {INDEX_NAME} ON auth_user (email COLLATE NOCASE);')
+
+
+def drop_email_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME};')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_employee_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'DROP INDEX accounts_auth_user_email_idx;',
+            'CREATE INDEX accounts_auth_user_email_idx ON auth_user (email);',
+        ),
+        migrations.RunPython(create_email_index, drop_email_index),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.1 on 2026-10-17 15:40
+
+from django.db import migrations, models
+
+# Поиск сотрудника идет по полям профиля с фамилией, именем и должностью в одном регистре (str.casefold)
+# и строится как поле LIKE '...%' (startswith), индексы для каждой базы свои:
+# PostgreSQL - индекс с varchar_pattern_ops (LIKE по префиксу при любом правиле сравнения базы);
+# SQLite - индекс с правилом сравнения NOCASE, без него SQLite не использует индекс для LIKE.
+# Индексы миграции 0010 (по UPPER и NOCASE исходных полей) больше не используются и удаляются
+SEARCH_INDEXES = (
+    ('accounts_profile_search_last_name_idx', 'search_last_name'),
+    ('accounts_profile_search_first_name_idx', 'search_first_name'),
+    ('accounts_profile_search_position_idx', 'search_position'),
+)
+
+OLD_SEARCH_INDEXES = (
+    ('accounts_auth_user_last_name_search_idx', 'auth_user', 'last_name'),
+    ('accounts_auth_user_first_name_search_idx', 'auth_user', 'first_name'),
+    ('accounts_profile_position_search_idx', 'accounts_profile', 'position'),
+)
+
+
+def fill_search_fields(apps, schema_editor):
+    Profile = apps.get_model('accounts', 'Profile')
+    profiles = list(Profile.objects.select_related('user'))
+    for profile in profiles:
+        profile.search_last_name = profile.user.last_name.casefold()[:150]
+        profile.search_first_name = profile.user.first_name.casefold()[:150]
+        profile.search_position = profile.position.casefold()[:100]
+    Profile.objects.bulk_update(profiles, ['search_last_name', 'search_first_name', 'search_position'],
+                                batch_size=500)
+
+
+def create_old_indexes(schema_editor):
+    vendor = schema_editor.connection.vendor
+    for name, table, column in OLD_SEARCH_INDEXES:
+        if vendor == 'postgresql':
+            schema_editor.execute(f'CREATE INDEX {name} ON {table} (UPPER({column}::text) text_pattern_ops);')
+        elif vendor == 'sqlite':
+            schema_editor.execute(f'CREATE INDEX {name} ON {table} ({column} COLLATE NOCASE);')
+
+
+def drop_indexes(schema_editor, names):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        for name in names:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {name};')
+
+
+def create_search_indexes(apps, schema_editor):
+    drop_indexes(schema_editor, [name for name, _, _ in OLD_SEARCH_INDEXES])
+    vendor = schema_editor.connection.vendor
+    for name, column in SEARCH_INDEXES:
+        if vendor == 'postgresql':
+            schema_editor.execute(f'CREATE INDEX {name} ON accounts_profile ({column} varchar_pattern_ops);')
+        elif vendor == 'sqlite':
+            schema_editor.execute(f'CREATE INDEX {name} ON accounts_profile ({column} COLLATE NOCASE);')
+
+
+def drop_search_indexes(apps, schema_editor):
+    drop_indexes(schema_editor, [name for name, _ in SEARCH_INDEXES])
+    create_old_indexes(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_auth_user_email_iexact_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='search_first_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=150),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='search_last_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=150),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='search_position',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_search_fields, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_profile_search_fields'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='profile',
+            name='first_name',
+        ),
+        migrations.RemoveField(
+            model_name='profile',
+            name='last_name',
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='phone_internal',
+            field=models.CharField(blank=True, default='', max_length=10, verbose_name='Внутренний номер'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='surname',
+            field=models.CharField(blank=True, default='', max_length=50, verbose_name='Отчество'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-17 17:05
+
+from django.db import migrations
+
+# Индексы поиска сотрудников (миграция 0012) создаются SQL-запросом и неизвестны Django,
+# поэтому при пересоздании таблицы accounts_profile в SQLite (миграция 0013) они пропали
+# Создаются повторно; в PostgreSQL таблица не пересоздается, и индексы уже есть
+SEARCH_INDEXES = (
+    ('accounts_profile_search_last_name_idx', 'search_last_name'),
+    ('accounts_profile_search_first_name_idx', 'search_first_name'),
+    ('accounts_profile_search_position_idx', 'search_position'),
+)
+
+
+def restore_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for name, column in SEARCH_INDEXES:
+        if vendor == 'postgresql':
+            schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON accounts_profile ({column} varchar_pattern_ops);')
+        elif vendor == 'sqlite':
+            schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON accounts_profile ({column} COLLATE NOCASE);')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_profile_drop_name_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_search_indexes, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
 
 # Роли
 ROLE_CHOICES = (
@@ -8,6 +10,10 @@ ROLE_CHOICES = (
     ('director', 'Генеральный директор'),
 )
 
+# Строка для поиска по началу: без учета регистра и в пределах длины поля
+def search_text(value, length=150):
+    return value.casefold()[:length]
+
 # Изменен порядок полей и добавлены новые
 class Profile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL,
@@ -22,9 +28,164 @@ class Profile(models.Model):
     # Добавлено поле для связи: кто начальник у этого сотрудника
     manager = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True,  null=True, related_name='subordinates',
                                 verbose_name="Начальник")
+    # Фамилия, имя и должность в одном регистре (str.casefold) для поиска сотрудников по началу строки:
+    # сравнение без учета регистра в SQLite работает только для латиницы, а имена обычно на кириллице
+    # Заполняются при сохранении профиля и пользователя (accounts/signals.py)
+    search_last_name = models.CharField(max_length=150, blank=True, default='', editable=False)
+    search_first_name = models.CharField(max_length=150, blank=True, default='', editable=False)
+    search_position = models.CharField(max_length=100, blank=True, default='', editable=False)
     def __str__(self):
         return f'Profile of {self.user.username}'
+
+    def fill_search_fields(self):
+        self.search_last_name = search_text(self.user.last_name)
+        self.search_first_name = search_text(self.user.first_name)
+        self.search_position = search_text(self.position, 100)
+
+    # Запрет циклов в иерархии: начальником нельзя назначить себя или своего подчиненного
+    # Проверяется формами (админка, ModelForm) и представлениями до сохранения: таблица замыкания
+    # перестраивается сигналом после сохранения, и цикл там был бы уже ошибкой сервера
+    def clean(self):
+        if not self.manager_id or not self.pk:
+            return
+        if self.manager_id == self.pk or \
+                ProfileClosure.objects.filter(ancestor_id=self.pk, descendant_id=self.manager_id).exists():
+            raise ValidationError({'manager': 'Начальник не может быть подчиненным этого сотрудника'})
     
     class Meta:
         verbose_name = 'Профиль'
-        verbose_name_plural = 'Профили'
\ No newline at end of file
+        verbose_name_plural = 'Профили'
+
+# Статусы фоновой задачи формирования отчета
+REPORT_JOB_STATUS_CHOICES = (
+    ('pending', 'В очереди'),
+    ('running', 'Формируется'),
+    ('done', 'Готов'),
+    ('failed', 'Ошибка'),
+)
+
+REPORT_JOB_KIND_CHOICES = (
+    ('team', 'Отчет по отделу'),
+    ('employee', 'Отчет по сотруднику'),
+)
+
+# Готовые отчеты не раздаются как медиафайлы, их выдает только представление с проверкой владельца
+report_storage = FileSystemStorage(location=settings.REPORTS_ROOT)
+
+
+def get_report_storage():
+    return report_storage
+
+
+# Фоновая задача формирования PDF-отчета
+# Создается запросом отчета, выполняется командой run_report_worker
+class ReportJob(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE,
+                             related_name='report_jobs')
+    kind = models.CharField(max_length=10, choices=REPORT_JOB_KIND_CHOICES)
+    employee = models.ForeignKey(Profile,
+                                 on_delete=models.CASCADE,
+                                 null=True, blank=True,
+                                 related_name='report_jobs')
+    base_url = models.CharField(max_length=200, blank=True)
+    # Период отчета (пустые границы - без ограничения)
+    date_from = models.DateField(null=True, blank=True)
+    date_to = models.DateField(null=True, blank=True)
+    # Версия данных, по которой сформирован отчет: готовый файл с той же версией выдается повторно
+    data_token = models.CharField(max_length=32, blank=True)
+    status = models.CharField(max_length=10, choices=REPORT_JOB_STATUS_CHOICES, default='pending')
+    file = models.FileField(upload_to='%Y/%m/%d/', storage=get_report_storage, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Отчет в очереди'
+        verbose_name_plural = 'Отчеты в очереди'
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+
+# Все пары (начальник любого уровня, подчиненный, глубина) по словарю profile_id -> manager_id
+# Сам профиль входит в свое поддерево с глубиной 0; зацикленные цепочки обрываются
+def closure_rows(managers):
+    for profile_id in managers:
+        depth, ancestor_id, seen = 0, profile_id, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            yield ancestor_id, profile_id, depth
+            depth, ancestor_id = depth + 1, managers.get(ancestor_id)
+
+
+class ProfileClosureQuerySet(models.QuerySet):
+    # Полный пересчет таблицы по полю Profile.manager
+    def rebuild(self):
+        managers = dict(Profile.objects.values_list('pk', 'manager_id'))
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create([ProfileClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth)
+                              for ancestor_id, descendant_id, depth in closure_rows(managers)],
+                             batch_size=1000)
+        return len(managers)
+
+    # Отрыв поддерева профиля от всех его начальников (связи внутри поддерева сохраняются)
+    def detach(self, profile_id, include_self=True):
+        subtree = self.filter(ancestor_id=profile_id)
+        if not include_self:
+            subtree = subtree.filter(depth__gt=0)
+        ancestors = list(self.filter(descendant_id=profile_id, depth__gt=0).values_list('ancestor_id', flat=True))
+        if not include_self:
+            ancestors.append(profile_id)
+        return self.filter(descendant_id__in=list(subtree.values_list('descendant_id', flat=True)),
+                           ancestor_id__in=ancestors).delete()
+
+    # Подвешивание поддерева профиля к новому начальнику:
+    # каждый начальник нового начальника получает в подчинение каждого сотрудника поддерева
+    def attach(self, profile_id, manager_id):
+        subtree = list(self.filter(ancestor_id=profile_id).values_list('descendant_id', 'depth'))
+        ancestors = list(self.filter(descendant_id=manager_id).values_list('ancestor_id', 'depth'))
+        if any(descendant_id == manager_id for descendant_id, _ in subtree):
+            raise ValueError('Начальник не может быть подчиненным своего сотрудника')
+        self.bulk_create([ProfileClosure(ancestor_id=ancestor_id,
+                                         descendant_id=descendant_id,
+                                         depth=ancestor_depth + descendant_depth + 1)
+                          for ancestor_id, ancestor_depth in ancestors
+                          for descendant_id, descendant_depth in subtree],
+                         batch_size=1000)
+
+    # Изменение начальника профиля
+    def move(self, profile, old_manager_id):
+        with transaction.atomic():
+            if not self.filter(ancestor_id=profile.pk, descendant_id=profile.pk).exists():
+                self.create(ancestor_id=profile.pk, descendant_id=profile.pk, depth=0)
+            if old_manager_id is not None:
+                self.detach(profile.pk)
+            if profile.manager_id is not None:
+                self.attach(profile.pk, profile.manager_id)
+
+
+# Иерархия подчинения в виде таблицы замыкания (closure table)
+# Хранит все пары "начальник любого уровня - подчиненный", поэтому поддерево любого начальника
+# выбирается одним запросом без рекурсии; поддерживается сигналами при изменении Profile.manager
+class ProfileClosure(models.Model):
+    ancestor = models.ForeignKey(Profile,
+                                 on_delete=models.CASCADE,
+                                 related_name='descendant_links')
+    descendant = models.ForeignKey(Profile,
+                                   on_delete=models.CASCADE,
+                                   related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    objects = ProfileClosureQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'],
+                                    name='profile_closure_unique_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'depth']),
+        ]
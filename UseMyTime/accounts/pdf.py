@@ -0,0 +1,58 @@
+import mimetypes
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from weasyprint import CSS, HTML, default_url_fetcher # Библиотека для формирования отчетов
+from weasyprint.text.fonts import FontConfiguration
+from metrics import timed
+from .reports import REPORT_STYLESHEET
+
+
+# Настройка шрифтов и разобранные стили создаются один раз на процесс
+# (обработчик очереди отчетов живет долго, поэтому каждый следующий отчет формируется "на прогретом")
+@lru_cache(maxsize=None)
+def get_font_config():
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=None)
+def get_report_stylesheet():
+    return CSS(filename=finders.find(REPORT_STYLESHEET), font_config=get_font_config())
+
+
+def warm_up():
+    get_report_stylesheet()
+
+
+# Путь к локальному файлу для статических и медиа URL или None
+def local_path(url):
+    path = unquote(urlparse(url).path)
+    for prefix, find in ((settings.STATIC_URL, finders.find),
+                         ('/' + settings.MEDIA_URL.lstrip('/'), lambda name: Path(settings.MEDIA_ROOT) / name)):
+        if prefix and path.startswith(prefix):
+            name = path[len(prefix):]
+            if '..' in Path(name).parts:
+                return None
+            found = find(name)
+            if found and Path(found).is_file():
+                return Path(found)
+    return None
+
+
+# Загрузка ресурсов отчета: статика и медиа читаются с диска, а не запрашиваются по HTTP у своего же сервера
+def local_url_fetcher(url, *args, **kwargs):
+    path = local_path(url) if url.startswith(('http://', 'https://', '/')) else None
+    if path is None:
+        return default_url_fetcher(url, *args, **kwargs)
+    return {'file_obj': path.open('rb'),
+            'mime_type': mimetypes.guess_type(path.name)[0],
+            'redirected_url': url}
+
+
+# Формирование PDF из разметки отчета (шаблон рендерится с pdf=True, без ссылки на стили)
+def render_pdf(html_string, base_url=None):
+    with timed('usemytime_pdf_render_duration_seconds'):
+        html = HTML(string=html_string, base_url=base_url or None, url_fetcher=local_url_fetcher)
+        return html.write_pdf(stylesheets=[get_report_stylesheet()], font_config=get_font_config())
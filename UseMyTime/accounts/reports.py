@@ -0,0 +1,290 @@
+import hashlib
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from pathlib import Path
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.db.models import Count, DurationField, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from projects.cache import get_user_data_versions
+from projects.models import DailyTime, Project, Task
+from .models import Profile
+
+# Сколько хранится готовая разметка отчета (устаревшие версии просто перестают запрашиваться)
+REPORT_CACHE_TIMEOUT = 60 * 60
+
+REPORT_STYLESHEET = 'accounts/css/report.css'
+
+
+# Стили отчета для HTML-страницы встраиваются в разметку (статика приложением не раздается),
+# в PDF они подключаются заранее разобранными (accounts/pdf.py); файл читается один раз на процесс
+@lru_cache(maxsize=None)
+def report_css():
+    return Path(finders.find(REPORT_STYLESHEET)).read_text(encoding='utf-8')
+
+
+def split_seconds(seconds):
+    return seconds // 3600, (seconds % 3600) // 60, seconds % 60
+
+
+# Период отчета из параметров ?from=&to= (даты ГГГГ-ММ-ДД, любая граница может отсутствовать)
+# Возвращает (date_from, date_to) или None, если период не задан; при неверных датах - ValueError
+def parse_report_period(params):
+    date_from, date_to = (date.fromisoformat(params[name]) if params.get(name) else None
+                          for name in ('from', 'to'))
+    if date_from and date_to and date_from > date_to:
+        raise ValueError('Начало периода позже его окончания')
+    if date_from is None and date_to is None:
+        return None
+    return date_from, date_to
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+# Условия отбора по границам периода: для дат (сводки по дням) и для моментов времени
+# (конец периода - начало следующего дня), чтобы запрос просматривал по индексу только строки периода
+def period_filters(period, field, moments=False):
+    date_from, date_to = period or (None, None)
+    filters = {}
+    if date_from:
+        filters[f'{field}__gte'] = day_start(date_from) if moments else date_from
+    if date_to:
+        if moments:
+            filters[f'{field}__lt'] = day_start(date_to + timedelta(days=1))
+        else:
+            filters[f'{field}__lte'] = date_to
+    return filters
+
+
+# Данные отчетов по сотрудникам за фиксированное число запросов, независимо от размера отдела:
+# 1) неархивные проекты с выполненными задачами - общее время, число выполненных задач и дата последней из них;
+# 2) сами выполненные задачи этих проектов (строки таблицы отчета);
+# 3) время за текущую неделю, сгруппированное по сотрудникам
+# За период (date_from, date_to) в отчет попадают задачи, выполненные в периоде, и время, учтенное в периоде
+# Возвращает словарь user_id -> данные сотрудника
+def collect_report_data(user_ids, day=None, period=None):
+    day = day or timezone.localdate()
+    done = Q(tasks__is_done=True, **period_filters(period, 'tasks__created_at', moments=True))
+    projects = Project.objects.filter(user_id__in=user_ids, is_archived=False)\
+                              .with_total_time(**period_filters(period, 'day'))\
+                              .annotate(completed_count=Count('tasks', filter=done),
+                                        completed_at=Max('tasks__created_at', filter=done))\
+                              .filter(completed_count__gt=0)\
+                              .order_by('user_id', 'pk')
+    tasks_by_project = defaultdict(list)
+    for task in Task.objects.filter(project__user_id__in=user_ids, project__is_archived=False, is_done=True,
+                                    **period_filters(period, 'created_at', moments=True))\
+                            .only('project_id', 'text')\
+                            .order_by('project_id', 'pk'):
+        tasks_by_project[task.project_id].append(task)
+    week_times = dict(DailyTime.objects.filter(user_id__in=user_ids)
+                                       .for_week(day)
+                                       .values('user_id')
+                                       .annotate(total=Sum('total_time'))
+                                       .values_list('user_id', 'total'))
+
+    reports = {user_id: {'project_data': [], 'total_tasks': 0, 'total_time': 0} for user_id in user_ids}
+    for project in projects:
+        report = reports[project.user_id]
+        hours, minutes, seconds = project.get_hours_minutes_seconds()
+        report['project_data'].append({
+            'project': project,
+            'tasks': tasks_by_project[project.pk],
+            'hours': hours,
+            'minutes': minutes,
+            'seconds': seconds,
+            'created_at': project.created_at,
+            # Дата завершения — дата последней выполненной задачи
+            'completed_at': project.completed_at,
+        })
+        report['total_tasks'] += project.completed_count
+        report['total_time'] += int(project.total_time.total_seconds())
+
+    for user_id, report in reports.items():
+        report['total_hours'], report['total_minutes'], report['total_seconds'] = split_seconds(report['total_time'])
+        week_time = week_times.get(user_id)
+        report['week_time'] = int(week_time.total_seconds()) if week_time else 0
+        report['week_hours'], report['week_minutes'], _ = split_seconds(report['week_time'])
+    return reports
+
+
+# Отчет по одному сотруднику
+def build_employee_report(employee, day=None, period=None):
+    return collect_report_data([employee.user_id], day, period)[employee.user_id]
+
+
+# Отчет по отделу: данные каждого сотрудника и итоги по отделу
+def build_team_report(team, day=None, period=None):
+    team = list(team)
+    reports = collect_report_data([employee.user_id for employee in team], day, period)
+    team_report = [{'employee': employee, **reports[employee.user_id]} for employee in team]
+
+    total_time = sum(item['total_time'] for item in team_report)
+    week_time = sum(item['week_time'] for item in team_report)
+    dept_total_hours, dept_total_minutes, dept_total_seconds = split_seconds(total_time)
+    dept_week_hours, dept_week_minutes, _ = split_seconds(week_time)
+    return {
+        'team_report': team_report,
+        'dept_total_hours': dept_total_hours,
+        'dept_total_minutes': dept_total_minutes,
+        'dept_total_seconds': dept_total_seconds,
+        'dept_total_tasks': sum(item['total_tasks'] for item in team_report),
+        'dept_week_hours': dept_week_hours,
+        'dept_week_minutes': dept_week_minutes,
+    }
+
+
+# Контекст шаблона отчета по отделу (общий для страницы и PDF)
+def team_report_context(manager, now=None, period=None):
+    team = manager.subordinates.select_related('user')
+    return {
+        'manager': manager,
+        'report_css': report_css(),
+        **build_team_report(team, period=period),
+        'period': period,
+        'now': now or timezone.now(),
+    }
+
+
+# Контекст шаблона отчета по сотруднику (общий для страницы и PDF)
+def employee_report_context(employee, now=None, period=None):
+    report = build_employee_report(employee, period=period)
+    return {
+        'employee': employee,
+        'report_css': report_css(),
+        'report_data': report['project_data'],
+        'total_tasks': report['total_tasks'],
+        'total_hours': report['total_hours'],
+        'total_minutes': report['total_minutes'],
+        'total_seconds': report['total_seconds'],
+        'week_hours': report['week_hours'],
+        'week_minutes': report['week_minutes'],
+        'period': period,
+        'now': now or timezone.now(),
+    }
+
+
+# Итог по сотруднику подзапросом (строки группируются по полю group и связываются с внешним запросом по user_id)
+def user_total_subquery(rows, group, total, default):
+    rows = rows.order_by().values(group).annotate(total=total).values('total')
+    output_field = DurationField() if isinstance(default, timedelta) else IntegerField()
+    return Coalesce(Subquery(rows, output_field=output_field), Value(default))
+
+
+# Отчет по организации директора: все сотрудники его поддерева любой глубины
+# Поддерево и личные итоги каждого сотрудника выбираются одним запросом по таблице замыкания,
+# строки выстраиваются деревом, итоги подразделений (сотрудник и все его подчиненные) складываются в Python
+def build_organisation_report(director, day=None):
+    day = day or timezone.localdate()
+    members = Profile.objects.filter(ancestor_links__ancestor=director, ancestor_links__depth__gt=0)\
+                             .select_related('user')\
+                             .annotate(depth=F('ancestor_links__depth'),
+                                       total_time=user_total_subquery(
+                                           DailyTime.objects.filter(user_id=OuterRef('user_id'),
+                                                                    project__is_archived=False),
+                                           'user_id', Sum('total_time'), timedelta(0)),
+                                       week_time=user_total_subquery(
+                                           DailyTime.objects.filter(user_id=OuterRef('user_id')).for_week(day),
+                                           'user_id', Sum('total_time'), timedelta(0)),
+                                       completed_tasks=user_total_subquery(
+                                           Task.objects.filter(project__user_id=OuterRef('user_id'),
+                                                               project__is_archived=False, is_done=True),
+                                           'project__user_id', Count('pk'), 0))\
+                             .order_by('user__last_name', 'user__first_name', 'pk')
+
+    children = defaultdict(list)
+    for member in members:
+        children[member.manager_id].append(member)
+
+    # Обход в глубину: порядок строк как в оргструктуре, итоги подразделения считаются после подчиненных
+    rows = []
+
+    def visit(member):
+        row = {'employee': member, 'depth': member.depth,
+               'total_tasks': member.completed_tasks,
+               'total_time': int(member.total_time.total_seconds()),
+               'week_time': int(member.week_time.total_seconds()),
+               'subordinates_count': 0}
+        rows.append(row)
+        row['unit_tasks'], row['unit_time'], row['unit_week_time'] = \
+            row['total_tasks'], row['total_time'], row['week_time']
+        for child in children[member.pk]:
+            child_row = visit(child)
+            row['subordinates_count'] += 1 + child_row['subordinates_count']
+            row['unit_tasks'] += child_row['unit_tasks']
+            row['unit_time'] += child_row['unit_time']
+            row['unit_week_time'] += child_row['unit_week_time']
+        return row
+
+    top = [visit(member) for member in children[director.pk]]
+    for row in rows:
+        row['total_hours'], row['total_minutes'], _ = split_seconds(row['total_time'])
+        row['week_hours'], row['week_minutes'], _ = split_seconds(row['week_time'])
+        row['unit_hours'], row['unit_minutes'], _ = split_seconds(row['unit_time'])
+        row['unit_week_hours'], row['unit_week_minutes'], _ = split_seconds(row['unit_week_time'])
+
+    org_time = sum(row['unit_time'] for row in top)
+    org_week_time = sum(row['unit_week_time'] for row in top)
+    org_total_hours, org_total_minutes, org_total_seconds = split_seconds(org_time)
+    org_week_hours, org_week_minutes, _ = split_seconds(org_week_time)
+    return {
+        'org_report': rows,
+        'org_employees': len(rows),
+        'org_total_tasks': sum(row['unit_tasks'] for row in top),
+        'org_total_hours': org_total_hours,
+        'org_total_minutes': org_total_minutes,
+        'org_total_seconds': org_total_seconds,
+        'org_week_hours': org_week_hours,
+        'org_week_minutes': org_week_minutes,
+    }
+
+
+# Контекст шаблона отчета по организации
+def organisation_report_context(director, now=None):
+    return {
+        'director': director,
+        'report_css': report_css(),
+        **build_organisation_report(director),
+        'now': now or timezone.now(),
+    }
+
+
+# Токен версии данных отчета: меняется при любом изменении данных сотрудников отчета,
+# состава отдела (меняется список сотрудников), с наступлением нового дня (недельные итоги, дата отчета)
+# и для каждого периода отчета свой
+def report_data_token(user_ids, day=None, period=None):
+    day = day or timezone.localdate()
+    versions = get_user_data_versions(user_ids)
+    date_from, date_to = period or (None, None)
+    raw = ';'.join([day.isoformat(), f'{date_from or ""}..{date_to or ""}'] +
+                   [f'{user_id}:{versions[user_id]}' for user_id in sorted(set(user_ids))])
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def team_report_token(manager, period=None):
+    return report_data_token([manager.user_id, *manager.subordinates.values_list('user_id', flat=True)],
+                             period=period)
+
+
+def organisation_report_token(director):
+    return report_data_token([director.user_id,
+                              *Profile.objects.filter(ancestor_links__ancestor=director)
+                                              .values_list('user_id', flat=True)])
+
+
+def employee_report_token(employee, period=None):
+    return report_data_token([employee.user_id], period=period)
+
+
+# Готовая разметка отчета из кэша, при промахе отчет формируется функцией render
+def cached_report_html(kind, subject_id, token, render):
+    key = f'report-html:{kind}:{subject_id}:{token}'
+    html = cache.get(key)
+    if html is None:
+        html = render()
+        cache.set(key, html, REPORT_CACHE_TIMEOUT)
+    return html
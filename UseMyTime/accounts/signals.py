@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from .models import Profile, ProfileClosure, search_text
+
+
+# Запоминание прежнего начальника, чтобы после сохранения перестроить только затронутое поддерево
+@receiver(pre_save, sender=Profile)
+def remember_manager(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        instance._old_manager_id = None
+        return
+    instance._old_manager_id = Profile.objects.filter(pk=instance.pk)\
+                                              .values_list('manager_id', flat=True).first()
+
+
+# Циклы отсекаются до сохранения (Profile.clean в формах и представлениях), здесь только перестройка таблицы;
+# ошибка attach здесь означает сохранение в обход проверки, а не ошибку ввода
+@receiver(post_save, sender=Profile)
+def update_profile_closure(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_manager_id = getattr(instance, '_old_manager_id', None)
+    if created or old_manager_id != instance.manager_id:
+        ProfileClosure.objects.move(instance, old_manager_id)
+
+
+# Подчиненные удаляемого профиля остаются без начальника (SET_NULL выполняется без сигналов),
+# поэтому их связи с начальниками удаляемого профиля убираются заранее
+@receiver(pre_delete, sender=Profile)
+def detach_profile_subtree(sender, instance, **kwargs):
+    ProfileClosure.objects.detach(instance.pk, include_self=False)
+
+
+# Поля поиска сотрудника повторяют фамилию, имя (из пользователя) и должность
+@receiver(pre_save, sender=Profile)
+def fill_profile_search_fields(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.fill_search_fields()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def update_profile_search_names(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or created or (update_fields is not None and not {'last_name', 'first_name'} & set(update_fields)):
+        return
+    Profile.objects.filter(user=instance).update(search_last_name=search_text(instance.last_name),
+                                                 search_first_name=search_text(instance.first_name))
@@ -1,3 +1,150 @@
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from accounts.jobs import delete_expired_jobs
+from accounts.models import Profile, ProfileClosure, ReportJob, get_report_storage
 
-# Create your tests here.
+
+# Вход по логину или почте (UsernameOrEmailBackend)
+class UsernameOrEmailBackendTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ivanov', 'Ivanov@Example.com', 'password')
+
+    def test_login_by_username(self):
+        self.assertEqual(authenticate(username='ivanov', password='password'), self.user)
+        self.assertIsNone(authenticate(username='ivanov', password='wrong'))
+
+    def test_login_by_email_ignores_case(self):
+        self.assertEqual(authenticate(username='ivanov@example.COM', password='password'), self.user)
+
+    def test_duplicate_email_is_rejected(self):
+        User.objects.create_user('petrov', 'ivanov@example.com', 'password')
+        self.assertIsNone(authenticate(username='ivanov@example.com', password='password'))
+        self.assertEqual(authenticate(username='ivanov', password='password'), self.user)
+
+    def test_username_match_wins_over_email_matches(self):
+        # Логин одного пользователя совпадает с почтой нескольких других, созданных раньше него
+        for username in ('petrov', 'smirnov', 'kuznetsov'):
+            User.objects.create_user(username, 'sidorov@example.com', 'password')
+        sidorov = User.objects.create_user('sidorov@example.com', 'sidorov@mail.example', 'secret')
+        self.assertEqual(authenticate(username='sidorov@example.com', password='secret'), sidorov)
+
+    def test_password_is_hashed_once_per_attempt(self):
+        attempts = [('ivanov', 'password'), ('ivanov', 'wrong'),
+                    ('ivanov@example.com', 'password'), ('nobody', 'password')]
+        for username, password in attempts:
+            with self.subTest(username=username, password=password), \
+                    mock.patch.object(User, 'check_password', autospec=True,
+                                      side_effect=User.check_password) as check_password, \
+                    mock.patch.object(User, 'set_password', autospec=True,
+                                      side_effect=User.set_password) as set_password:
+                authenticate(username=username, password=password)
+                self.assertEqual(check_password.call_count + set_password.call_count, 1)
+
+
+# Таблица замыкания иерархии поддерживается сигналами так же, как ее полный пересчет
+class ProfileClosureTests(TestCase):
+    def setUp(self):
+        self.director = self.profile('director', role='director')
+        self.manager = self.profile('manager', self.director, role='manager')
+        self.employee = self.profile('employee', self.manager)
+        self.trainee = self.profile('trainee', self.employee)
+
+    def profile(self, username, manager=None, role='employee'):
+        return Profile.objects.create(user=User.objects.create_user(username, password='password'),
+                                      manager=manager, role=role)
+
+    def closure(self):
+        return set(ProfileClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def assertMatchesRebuild(self):
+        maintained = self.closure()
+        ProfileClosure.objects.rebuild()
+        self.assertEqual(maintained, self.closure())
+
+    def test_new_profiles_extend_the_chain(self):
+        self.assertIn((self.director.pk, self.trainee.pk, 3), self.closure())
+        self.assertMatchesRebuild()
+
+    def test_move_subtree(self):
+        other = self.profile('other', role='director')
+        self.manager.manager = other
+        self.manager.save()
+        closure = self.closure()
+        self.assertIn((other.pk, self.trainee.pk, 3), closure)
+        self.assertNotIn((self.director.pk, self.employee.pk, 2), closure)
+        self.assertIn((self.manager.pk, self.trainee.pk, 2), closure)
+        self.assertMatchesRebuild()
+
+    def test_detach_subtree(self):
+        self.employee.manager = None
+        self.employee.save()
+        self.assertFalse(ProfileClosure.objects.filter(ancestor_id__in=[self.director.pk, self.manager.pk],
+                                                       descendant_id__in=[self.employee.pk, self.trainee.pk]))
+        self.assertIn((self.employee.pk, self.trainee.pk, 1), self.closure())
+        self.assertMatchesRebuild()
+
+    def test_delete_middle_profile(self):
+        self.manager.delete()
+        self.employee.refresh_from_db()
+        self.assertIsNone(self.employee.manager_id)
+        self.assertFalse(ProfileClosure.objects.filter(ancestor=self.director, depth__gt=0))
+        self.assertMatchesRebuild()
+
+    def test_cycle_is_rejected_before_save(self):
+        for manager in (self.trainee, self.manager):
+            with self.subTest(manager=manager.user.username):
+                self.manager.manager = manager
+                with self.assertRaises(ValidationError):
+                    self.manager.clean()
+        self.manager.refresh_from_db()
+        self.assertEqual(self.manager.manager, self.director)
+
+    def test_team_page_reports_cycle(self):
+        self.employee.role = 'manager'
+        self.employee.save()
+        self.client.force_login(self.employee.user)
+        response = self.client.post(reverse('my_team'), {'employee_id': self.manager.pk}, follow=True)
+        self.assertEqual([str(message) for message in response.context['messages']],
+                         ['Начальник не может быть подчиненным этого сотрудника'])
+        self.manager.refresh_from_db()
+        self.assertEqual(self.manager.manager, self.director)
+        self.assertMatchesRebuild()
+
+
+# Устаревшие задачи очереди отчетов удаляются вместе с файлами, свежие и незавершенные остаются
+class ExpiredReportJobsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('manager', password='password')
+        self.jobs = []
+
+    def tearDown(self):
+        for job in self.jobs:
+            if job.file:
+                job.file.storage.delete(job.file.name)
+
+    def job(self, status, finished_days_ago=None, with_file=False):
+        finished_at = timezone.now() - timedelta(days=finished_days_ago) if finished_days_ago is not None else None
+        job = ReportJob.objects.create(user=self.user, kind='team', status=status, finished_at=finished_at)
+        if with_file:
+            job.file.save('report.pdf', ContentFile(b'%PDF'))
+        self.jobs.append(job)
+        return job
+
+    def test_old_finished_jobs_and_files_are_deleted(self):
+        expired = self.job('done', finished_days_ago=10, with_file=True)
+        failed = self.job('failed', finished_days_ago=10)
+        fresh = self.job('done', finished_days_ago=1, with_file=True)
+        pending = self.job('pending')
+        self.assertEqual(delete_expired_jobs(timedelta(days=7)), 2)
+        self.assertEqual(set(ReportJob.objects.values_list('pk', flat=True)), {fresh.pk, pending.pk})
+        storage = get_report_storage()
+        self.assertFalse(storage.exists(expired.file.name))
+        self.assertTrue(storage.exists(fresh.file.name))
+        self.assertFalse(ReportJob.objects.filter(pk=failed.pk).exists())
@@ -0,0 +1,101 @@
+import math
+import time
+from functools import wraps
+from hashlib import md5
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+# Ограничение частоты запросов "ведром токенов" (token bucket)
+# У каждого ключа (IP-адрес, пользователь, введенный логин) есть ведро на N запросов,
+# которое равномерно наполняется за период частоты; пустое ведро - ответ 429 без выполнения представления
+# Состояние ведер хранится в кэше Django, частоты задаются в settings.THROTTLE_RATES по имени ограничения
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+# Частота вида "10/m": 10 запросов в минуту, возвращает (емкость ведра, период в секундах)
+def parse_rate(rate):
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+# IP-адрес клиента; за прокси берется адрес, добавленный в X-Forwarded-For ближайшим доверенным прокси
+def client_ip(request):
+    proxies = getattr(settings, 'THROTTLE_PROXY_COUNT', 0)
+    forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+    if proxies and len(forwarded) >= proxies:
+        return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+# Ключи ведер: 'ip', 'user' (для анонимных - IP) или функция от запроса
+def ip_key(request):
+    return client_ip(request)
+
+
+def user_key(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return client_ip(request)
+
+
+# Значение поля формы (логин, почта) без учета регистра; пустое поле - ведро по IP
+# per_ip - отдельное ведро для каждой пары (значение, IP): иначе чужими попытками входа
+# можно было бы исчерпать ведро владельца логина и не дать ему войти
+def post_field_key(field, per_ip=False):
+    def key(request):
+        value = request.POST.get(field, '').strip().lower()
+        if not value:
+            return client_ip(request)
+        return f'{field}:{value}:{client_ip(request)}' if per_ip else f'{field}:{value}'
+    return key
+
+
+KEY_FUNCTIONS = {'ip': ip_key, 'user': user_key}
+
+
+# Забор токена из ведра, возвращает 0 при успехе или число секунд до появления следующего токена
+def take_token(scope, ident, rate):
+    capacity, period = parse_rate(rate)
+    key = f'throttle:{scope}:{md5(ident.encode()).hexdigest()}'
+    now = time.time()
+    tokens, updated_at = cache.get(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated_at) * capacity / period)
+    if tokens < 1:
+        cache.set(key, (tokens, now), period)
+        return math.ceil((1 - tokens) * period / capacity)
+    cache.set(key, (tokens - 1, now), period)
+    return 0
+
+
+def too_many_requests(retry_after, json):
+    if json:
+        response = JsonResponse({'is_success': False,
+                                 'error': 'Too many requests'}, status=429)
+    else:
+        response = HttpResponse('Слишком много запросов, повторите попытку позже', status=429,
+                                content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+# Декоратор ограничения частоты для представления
+# scope - имя ограничения в settings.THROTTLE_RATES (без записи ограничение выключено),
+# key - 'ip', 'user' или функция от запроса, methods - ограничиваемые методы (GET страницы входа не считается),
+# json - ответ 429 в формате эндпоинтов с JsonResponse
+# Пример: @throttle('login', key='ip') и @throttle('login_username', key=post_field_key('username', per_ip=True))
+def throttle(scope, key='ip', methods=('POST',), json=False):
+    get_ident = KEY_FUNCTIONS[key] if isinstance(key, str) else key
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            rate = getattr(settings, 'THROTTLE_RATES', {}).get(scope)
+            if rate and request.method in methods:
+                retry_after = take_token(scope, get_ident(request), rate)
+                if retry_after:
+                    return too_many_requests(retry_after, json)
+            return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
@@ -1,7 +1,21 @@
+from django.contrib.auth import views as auth_views
 from django.urls import path, include
 from . import views
+from .throttling import post_field_key, throttle
 
 urlpatterns = [
+    # Вход и сброс пароля с ограничением частоты: по IP и по введенному логину/почте
+    # (проверка пароля и отправка письма - самые дорогие запросы без авторизации)
+    # Ведро логина общее только для попыток с одного IP, чтобы посторонний не мог заблокировать вход владельцу;
+    # ведро почты общее, оно защищает почтовый ящик от потока писем
+    path('login/',
+         throttle('login', key='ip')(
+             throttle('login_username', key=post_field_key('username', per_ip=True))(auth_views.LoginView.as_view())),
+         name='login'),
+    path('password_reset/',
+         throttle('password_reset', key='ip')(
+             throttle('password_reset_email', key=post_field_key('email'))(auth_views.PasswordResetView.as_view())),
+         name='password_reset'),
     # Пути и представления для входа, смены и сброса пароля
     path('', include('django.contrib.auth.urls')),
 
@@ -10,8 +24,14 @@ urlpatterns = [
     path('edit/', views.edit, name='profile_edit'),
     # Добавлены новые пути
     path('my-team/', views.my_team, name='my_team'),
+    path('my-team/search/', views.employee_search, name='employee_search'),
+    path('my-team/<int:employee_id>/tasks/', views.team_tasks_page, name='team_tasks_page'),
+    path('my-team/stream/', views.team_stream, name='team_stream'),
     path('my-team/remove/<int:employee_id>/', views.remove_from_team, name='remove_from_team'),
     path('employee/<int:user_id>/edit/', views.edit_employee, name='edit_employee'),
     path('report/', views.generate_report, name='generate_report'),
+    path('report/organisation/', views.organisation_report, name='organisation_report'),
     path('report/<int:employee_id>/', views.employee_report, name='employee_report'),
+    path('report/jobs/<int:job_id>/', views.report_job_status, name='report_job_status'),
+    path('report/jobs/<int:job_id>/download/', views.report_job_download, name='report_job_download'),
 ]
\ No newline at end of file
@@ -1,17 +1,31 @@
-from django.http import HttpResponse
+from django.http import (HttpResponse, StreamingHttpResponse, HttpResponseBadRequest, HttpResponseForbidden,
+                         JsonResponse, FileResponse)
+from django.urls import reverse
+from django.core.handlers.asgi import ASGIRequest
+import asyncio
+import json
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from .forms import UserRegistrationForm, UserEditForm, ProfileEditForm
-from .models import Profile
+from .models import Profile, ReportJob, search_text
 from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
+from django.utils.text import Truncator
 
 # Добавлены библиотеки
-from projects.models import Project, Task
+from projects.models import Task, ActiveProject
+from projects import events
+from projects.pagination import InvalidCursor, keyset_page
 from django.utils import timezone
 from django.template.loader import render_to_string
-from weasyprint import HTML # Библиотека для формирования отчетов
 from .decorators import role_required # Кастомный декоратор для проверки роли пользователя
+from .reports import (cached_report_html, employee_report_context, employee_report_token,
+                      organisation_report_context, organisation_report_token, parse_report_period,
+                      team_report_context, team_report_token)
+from .jobs import enqueue_report, report_filename
+from .exports import csv_response, report_rows
 
 # Отображение профиля
 @login_required
@@ -62,6 +76,16 @@ def edit(request):
                   {'user_form': user_form,
                    'profile_form': profile_form})
 
+# Все доступные сотрудники: без начальника, не manager/director, и НЕ is_staff / is_superuser
+def available_employees():
+    return Profile.objects.filter(manager__isnull=True).exclude(
+        role__in=['manager', 'director']
+    ).exclude(
+        user__is_staff=True  # исключаем админов
+    ).exclude(
+        user__is_superuser=True  # исключаем суперпользователей
+    )
+
 # Добавлена страница отдела для начальников
 @login_required
 @role_required(['manager'])
@@ -69,29 +93,22 @@ def my_team(request):
     profile = request.user.profile
 
     # Все подчинённые (кто имеет этого пользователя как manager)
-    team = profile.subordinates.all()
-
-    # Собираем задачи для каждого сотрудника
-    team_tasks = []
-    for employee in team:
-        # Находим все проекты, где employee.user — владелец
-        employee_projects = Project.objects.filter(user=employee.user, is_archived=False)
-        # Находим все задачи из этих проектов
-        tasks = Task.objects.filter(project__in=employee_projects)
-
-        team_tasks.append({
-            'employee': employee,
-            'tasks': tasks
-        })
-
-    # Все доступные сотрудники: без начальника, не manager/director, и НЕ is_staff / is_superuser
-    available_employees = Profile.objects.filter(manager__isnull=True).exclude(
-        role__in=['manager', 'director']
-    ).exclude(
-        user__is_staff=True  # исключаем админов
-    ).exclude(
-        user__is_superuser=True  # исключаем суперпользователей
-    )
+    # Страница показывает только сводку по сотруднику (число задач считается аннотацией),
+    # сами задачи загружаются при раскрытии панели сотрудника (team_tasks_page)
+    active = Q(user__projects__is_archived=False)
+    team = profile.subordinates.select_related('user')\
+                               .annotate(tasks_count=Count('user__projects__tasks', filter=active),
+                                         done_count=Count('user__projects__tasks',
+                                                          filter=active & Q(user__projects__tasks__is_done=True)))\
+                               .order_by('pk')
+
+    # Текущее состояние таймеров сотрудников (дальше обновляется через поток событий team_stream)
+    timers = {active_project.user_id: active_project
+              for active_project in ActiveProject.objects.filter(user__profile__manager=profile,
+                                                                 project__isnull=False)
+                                                         .select_related('project', 'current_program')}
+
+    team_tasks = [{'employee': employee, 'timer': timers.get(employee.user_id)} for employee in team]
 
     if request.method == "POST":
         employee_id = request.POST.get('employee_id')
@@ -100,17 +117,107 @@ def my_team(request):
             if employee.user.is_staff or employee.user.is_superuser:
                 messages.error(request, "Нельзя добавить администратора в команду.")
             else:
+                # Иерархия проверяется до сохранения (Profile.clean), сигнал таблицы замыкания ошибок не ждет
                 employee.manager = profile
-                employee.save()
-                messages.success(request, f"{ employee.user.last_name } { employee.user.first_name } ({ employee.position }) добавлен(а) в вашу команду.")
+                try:
+                    employee.clean()
+                except ValidationError as error:
+                    messages.error(request, ' '.join(error.messages))
+                else:
+                    employee.save()
+                    messages.success(request, f"{ employee.user.last_name } { employee.user.first_name } ({ employee.position }) добавлен(а) в вашу команду.")
             return redirect('my_team')
 
     context = {
         'team_tasks': team_tasks,
-        'available_employees': available_employees,
+        'team_stream_enabled': team_stream_enabled(request),
     }
     return render(request, 'accounts/my_team.html', context)
 
+# Поиск доступных сотрудников для добавления в отдел (подсказки в поле ввода на странице отдела)
+# Совпадение по началу фамилии, имени или должности без учета регистра; по каждому полю отдельный
+# запрос по индексу к полям поиска профиля (миграция 0012_profile_search_fields), результаты объединяются
+EMPLOYEE_SEARCH_LIMIT = 10
+
+@login_required
+@role_required(['manager'])
+def employee_search(request):
+    query = search_text(request.GET.get('q', '').strip())
+    found = {}
+    if query:
+        for lookup in ('search_last_name__startswith', 'search_first_name__startswith', 'search_position__startswith'):
+            for employee in available_employees().filter(**{lookup: query})\
+                                                 .select_related('user')[:EMPLOYEE_SEARCH_LIMIT]:
+                found[employee.pk] = employee
+    employees = sorted(found.values(),
+                       key=lambda employee: (employee.user.last_name, employee.user.first_name, employee.pk))
+    return JsonResponse({'is_success': True,
+                         'items': [{'id': employee.pk,
+                                    'name': f'{employee.user.last_name} {employee.user.first_name}',
+                                    'position': employee.position}
+                                   for employee in employees[:EMPLOYEE_SEARCH_LIMIT]]})
+
+# Страница задач сотрудника отдела (загружается при раскрытии панели сотрудника на странице отдела)
+@login_required
+@role_required(['manager'])
+def team_tasks_page(request, employee_id):
+    employee = get_object_or_404(Profile, id=employee_id, manager=request.user.profile)
+    queryset = Task.objects.filter(project__user_id=employee.user_id, project__is_archived=False)\
+                           .select_related('project')
+    try:
+        tasks, next_cursor = keyset_page(queryset, request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'is_success': False,
+                             'error': 'Invalid cursor'}, status=400)
+    return JsonResponse({'is_success': True,
+                         'items': [{'id': task.pk,
+                                    'project': task.project.title,
+                                    'text': Truncator(task.text).chars(80),
+                                    'is_done': task.is_done,
+                                    'created_at': timezone.localtime(task.created_at).strftime('%d.%m.%Y')}
+                                   for task in tasks],
+                         'next_cursor': next_cursor})
+
+# Поток событий (SSE) с изменениями таймеров сотрудников отдела
+# Одно долгоживущее соединение заменяет периодическое обновление страницы отдела
+# Поток работает только под ASGI-сервером в одном процессе (см. asgi.py и projects/events.py):
+# под WSGI бесконечный поток занимал бы синхронный воркер до таймаута, поэтому там он выключен
+TEAM_STREAM_KEEPALIVE = 20
+
+
+def team_stream_enabled(request):
+    return isinstance(request, ASGIRequest)
+
+
+async def team_stream(request):
+    # Ответ 204 останавливает переподключения EventSource
+    if not team_stream_enabled(request):
+        return HttpResponse(status=204)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponseForbidden()
+    profile = await Profile.objects.filter(user=user).afirst()
+    if profile is None or profile.role != 'manager':
+        return HttpResponseForbidden()
+    user_ids = [user_id async for user_id in profile.subordinates.values_list('user_id', flat=True)]
+
+    async def stream():
+        with events.subscribe(user_ids) as subscription:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), TEAM_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Комментарий держит соединение открытым через прокси
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'event: timer\ndata: {json.dumps(event)}\n\n'
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # Добавлена возможность убирать сотрудников из отдела
 @login_required
 @role_required(['manager'])
@@ -162,151 +269,98 @@ def edit_employee(request, user_id):
                    'profile_form': profile_form})
 
 # Добавлена возможность генерировать отчет по всему отделу
+# Данные собираются модулем reports фиксированным числом запросов,
+# PDF формируется в фоне (run_report_worker), в ответ возвращается задача в очереди
 @login_required
 #@role_required(['manager'])
 def generate_report(request):
     profile = request.user.profile
-    team = Profile.objects.filter(manager=profile)
-
-    team_report = []
-    total_department_time = 0
-    total_department_tasks = 0
-
-    for employee in team:
-        user = employee.user
-
-        # Только неархивные проекты
-        projects = Project.objects.filter(user=user, is_archived=False)
-        completed_tasks = Task.objects.filter(
-            project__in=projects,
-            is_done=True
-        ).select_related('project')
-
-        employee_data = {
-            'employee': employee,
-            'project_data': [],
-            'total_hours': 0,
-            'total_minutes': 0,
-            'total_tasks': completed_tasks.count()
-        }
-
-        total_seconds = 0
-
-        for project in projects:
-            tasks = completed_tasks.filter(project=project)
-            if tasks.exists():
-                proj_seconds = int(project.total_time.total_seconds())
-                total_seconds += proj_seconds
-                hours, minutes, seconds = project.get_hours_minutes_seconds()
-
-                # Дата завершения — дата последней выполненной задачи
-                last_task = tasks.order_by('-created_at').first()
-
-                employee_data['project_data'].append({
-                    'project': project,
-                    'tasks': tasks,
-                    'hours': hours,
-                    'minutes': minutes,
-                    'seconds': seconds,
-                    'created_at': project.created_at,
-                    'completed_at': last_task.created_at,
-                })
-
-        # Общее время по сотруднику
-        employee_data['total_hours'] = total_seconds // 3600
-        employee_data['total_minutes'] = (total_seconds % 3600) // 60
-        employee_data['total_seconds'] = total_seconds % 60
-        total_department_time += total_seconds
-        total_department_tasks += employee_data['total_tasks']
-
-        team_report.append(employee_data)
-
-    # Общее время по отделу
-    dept_total_hours = total_department_time // 3600
-    dept_total_minutes = (total_department_time % 3600) // 60
 
-    context = {
-        'manager': profile,
-        'team_report': team_report,
-        'dept_total_hours': dept_total_hours,
-        'dept_total_minutes': dept_total_minutes,
-        'dept_total_tasks': total_department_tasks,
-        'dept_total_seconds': total_department_time % 60,
-        'now': timezone.now(),
-    }
+    # Отчет за период ?from=&to= (без параметров - за все время)
+    try:
+        period = parse_report_period(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('Неверный период отчета')
+
+    # Выгрузка в CSV (потоком, без сборки отчета в памяти)
+    if request.GET.get('format') == 'csv':
+        user_ids = list(profile.subordinates.values_list('user_id', flat=True))
+        return csv_response(request, report_rows(user_ids, period),
+                            f'отчет_{profile.user.last_name}_{timezone.now().strftime("%Y%m%d")}.csv')
+
+    # Повторные запросы при неизменных данных отдаются из кэша
+    token = team_report_token(profile, period)
 
     # Если запрос на PDF
     if request.GET.get('format') == 'pdf':
-        html_string = render_to_string('accounts/team_report.html', context)
-        html = HTML(string=html_string, base_url=request.build_absolute_uri('/'))
-        result = html.write_pdf()
+        job = enqueue_report(request.user, 'team', base_url=request.build_absolute_uri('/'),
+                             data_token=token, period=period)
+        return report_job_response(job)
 
-        response = HttpResponse(result, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="отчет_{employee.user.last_name}_{timezone.now().strftime("%Y%m%d")}.pdf"'
-        return response
-
-    return render(request, 'accounts/team_report.html', context)
+    return HttpResponse(cached_report_html('team', profile.pk, token,
+                                           lambda: render_to_string('accounts/team_report.html',
+                                                                    team_report_context(profile, period=period))))
 
 # Добавлена возможность генерировать отчет по каждому сотруднику отдельно
 @login_required
 #@role_required(['manager'])
 def employee_report(request, employee_id):
     # Получаем сотрудника
-    employee = get_object_or_404(Profile, id=employee_id)
-    user = employee.user
-
-    # Только неархивные проекты
-    projects = Project.objects.filter(user=user, is_archived=False)
-
-    # Только выполненные задачи
-    completed_tasks = Task.objects.filter(
-        project__in=projects,
-        is_done=True
-    ).select_related('project')
-
-    # Подготовка данных: группировка по проектам
-    report_data = []
-    total_time_seconds = 0
-
-    for project in projects:
-        tasks = completed_tasks.filter(project=project)
-        if tasks.exists():
-            hours, minutes, seconds = project.get_hours_minutes_seconds()  # [ч, м]
-            total_time_seconds += int(project.total_time.total_seconds())
-
-            report_data.append({
-                'project': project,
-                'tasks': tasks,
-                'hours': hours,
-                'minutes': minutes,
-                'seconds': seconds,
-                'created_at': project.created_at,
-                # Завершение — дата последней выполненной задачи
-                'completed_at': tasks.order_by('-created_at').first().created_at,
-            })
-
-    # Общее время
-    total_hours = total_time_seconds // 3600
-    total_minutes = (total_time_seconds % 3600) // 60
+    employee = get_object_or_404(Profile.objects.select_related('user'), id=employee_id)
 
-    context = {
-        'employee': employee,
-        'report_data': report_data,
-        'completed_tasks': completed_tasks,
-        'total_hours': total_hours,
-        'total_minutes': total_minutes,
-        'total_seconds': total_time_seconds,
-        'now': timezone.now(),
-    }
+    # Отчет за период ?from=&to= (без параметров - за все время)
+    try:
+        period = parse_report_period(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('Неверный период отчета')
+
+    # Выгрузка в CSV (потоком, без сборки отчета в памяти)
+    if request.GET.get('format') == 'csv':
+        return csv_response(request, report_rows([employee.user_id], period),
+                            f'отчет_{employee.user.last_name}_{timezone.now().strftime("%Y%m%d")}.csv')
+
+    token = employee_report_token(employee, period)
 
     # Если запрос на PDF
     if request.GET.get('format') == 'pdf':
-        html_string = render_to_string('accounts/employee_report.html', context)
-        html = HTML(string=html_string, base_url=request.build_absolute_uri('/'))
-        result = html.write_pdf()
+        job = enqueue_report(request.user, 'employee', employee,
+                             base_url=request.build_absolute_uri('/'), data_token=token, period=period)
+        return report_job_response(job)
+
+    return HttpResponse(cached_report_html('employee', employee.pk, token,
+                                           lambda: render_to_string('accounts/employee_report.html',
+                                                                    employee_report_context(employee,
+                                                                                            period=period))))
+
+# Отчет директора по всей организации: сотрудники всех уровней подчинения с итогами подразделений
+@login_required
+@role_required(['director'])
+def organisation_report(request):
+    profile = request.user.profile
+    token = organisation_report_token(profile)
+    return HttpResponse(cached_report_html('organisation', profile.pk, token,
+                                           lambda: render_to_string('accounts/organisation_report.html',
+                                                                    organisation_report_context(profile))))
+
+# Состояние задачи формирования отчета (для опроса со страницы)
+def report_job_response(job):
+    data = {'job_id': job.pk,
+            'status': job.status,
+            'status_url': reverse('report_job_status', kwargs={'job_id': job.pk})}
+    if job.status == 'done':
+        data['download_url'] = reverse('report_job_download', kwargs={'job_id': job.pk})
+    elif job.status == 'failed':
+        data['error'] = job.error
+    return JsonResponse(data, status=202 if job.status in ('pending', 'running') else 200)
 
-        response = HttpResponse(result, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="отчет_{employee.user.last_name}_{timezone.now().strftime("%Y%m%d")}.pdf"'
-        return response
+@login_required
+def report_job_status(request, job_id):
+    job = get_object_or_404(ReportJob, pk=job_id, user=request.user)
+    return report_job_response(job)
 
-    return render(request, 'accounts/employee_report.html', context)
\ No newline at end of file
+# Выдача готового отчета
+@login_required
+def report_job_download(request, job_id):
+    job = get_object_or_404(ReportJob, pk=job_id, user=request.user, status='done')
+    return FileResponse(job.file.open('rb'), as_attachment=True,
+                        filename=report_filename(job), content_type='application/pdf')
@@ -5,12 +5,17 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Поток событий панели отдела (accounts.views.team_stream) работает только под
+ASGI-сервером, а рассылка изменений таймеров идет внутри одного процесса,
+поэтому приложение запускается одним процессом, например:
+    uvicorn asgi:application
 """
 
 import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'UseMyTime.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
 
 application = get_asgi_application()
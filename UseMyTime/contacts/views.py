@@ -2,6 +2,7 @@ from django.shortcuts import render, HttpResponseRedirect
 from django.urls import reverse_lazy
 from .models import Contact
 from .forms import QuestionForm
+from accounts.throttling import throttle
 
 # Главная страница контактов
 def contacts(request):
@@ -9,6 +10,7 @@ def contacts(request):
     return render(request, 'contacts/index.html', {'contacts': contacts})
 
 # Задание вопроса разработчикам (можно посмотреть в админке)
+@throttle('ask', key='user')
 def ask(request):
     if request.method == 'POST':
         form = QuestionForm(request.POST)
@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Метрики приложения в формате Prometheus: время обработки запросов по представлениям,
+# число и время запросов к базе, время формирования PDF-отчетов, медленные запросы
+# Значения копятся в памяти процесса; если задан settings.METRICS_DIR, каждый процесс
+# (процессы сервера, обработчик очереди отчетов) периодически сбрасывает их в свой файл,
+# а эндпоинт метрик суммирует файлы всех процессов
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('usemytime.slow_queries')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PDF_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Через сколько интервалов сброса без обновления файл завершившегося процесса удаляется
+STALE_FLUSH_INTERVALS = 6
+
+# Имя метрики -> (тип, описание, границы корзин гистограммы)
+METRICS = {
+    'usemytime_request_duration_seconds': ('histogram', 'Время обработки запроса', LATENCY_BUCKETS),
+    'usemytime_responses_total': ('counter', 'Ответы по кодам статуса', None),
+    'usemytime_db_queries_total': ('counter', 'Запросы к базе данных', None),
+    'usemytime_db_query_duration_seconds_total': ('counter', 'Суммарное время запросов к базе данных', None),
+    'usemytime_slow_queries_total': ('counter', 'Запросы к базе дольше SLOW_QUERY_THRESHOLD', None),
+    'usemytime_pdf_render_duration_seconds': ('histogram', 'Время формирования PDF-отчета', PDF_BUCKETS),
+}
+
+_lock = threading.Lock()
+# (имя, метки) -> значение счетчика
+_counters = defaultdict(float)
+# (имя, метки) -> [число значений в каждой корзине..., в последней - больше всех границ]
+_buckets = {}
+# (имя, метки) -> [сумма значений, число значений]
+_totals = {}
+# Сброс в файл: момент последнего сброса и временный файл общие для потоков процесса
+_flush_lock = threading.Lock()
+_flushed_at = 0.0
+
+
+def label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def inc(name, labels=None, value=1):
+    with _lock:
+        _counters[name, label_key(labels)] += value
+
+
+def observe(name, value, labels=None):
+    key = (name, label_key(labels))
+    buckets = METRICS[name][2]
+    with _lock:
+        if key not in _buckets:
+            _buckets[key] = [0] * (len(buckets) + 1)
+            _totals[key] = [0.0, 0]
+        _buckets[key][bisect_left(buckets, value)] += 1
+        _totals[key][0] += value
+        _totals[key][1] += 1
+
+
+# Замер длительности блока кода в гистограмму
+@contextmanager
+def timed(name, labels=None):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, labels)
+
+
+def snapshot():
+    with _lock:
+        return {'counters': [[name, labels, value] for (name, labels), value in _counters.items()],
+                'histograms': [[name, labels, list(_buckets[name, labels]), *_totals[name, labels]]
+                               for name, labels in _buckets]}
+
+
+# Сброс метрик процесса в файл METRICS_DIR/<pid>.json (не чаще METRICS_FLUSH_INTERVAL, если не force)
+# Файл заменяется целиком, поэтому читающий процесс не видит его наполовину записанным;
+# потоки одного процесса пишут по очереди, ошибка записи только пишется в журнал и не ломает запрос
+def flush(force=False):
+    global _flushed_at
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory:
+        return
+    with _flush_lock:
+        now = time.monotonic()
+        if not force and now - _flushed_at < getattr(settings, 'METRICS_FLUSH_INTERVAL', 10):
+            return
+        _flushed_at = now
+        directory = Path(directory)
+        path = directory / f'{os.getpid()}.json'
+        temp_path = path.with_suffix('.tmp')
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            temp_path.write_text(json.dumps(snapshot()))
+            os.replace(temp_path, path)
+        except OSError:
+            logger.exception('Не удалось сохранить метрики в %s', path)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+# Удаление файлов завершившихся процессов, которые не обновлялись STALE_FLUSH_INTERVALS интервалов сброса
+# (иначе счетчики перезапущенных процессов суммировались бы вечно); проверка процесса работает,
+# если все процессы запущены на одной машине, как и предполагает общий каталог METRICS_DIR
+def prune_stale(directory):
+    max_age = STALE_FLUSH_INTERVALS * getattr(settings, 'METRICS_FLUSH_INTERVAL', 10)
+    now = time.time()
+    for path in Path(directory).glob('*.json'):
+        try:
+            stale = now - path.stat().st_mtime > max_age
+            if stale and path.stem.isdigit() and not process_alive(int(path.stem)):
+                path.unlink()
+        except OSError:
+            continue
+
+
+# Метрики всех процессов (из файлов METRICS_DIR) или только текущего процесса
+def collect():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory:
+        snapshots = [snapshot()]
+    else:
+        flush(force=True)
+        prune_stale(directory)
+        snapshots = []
+        for path in Path(directory).glob('*.json'):
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+
+    counters = defaultdict(float)
+    histograms = {}
+    for data in snapshots:
+        for name, labels, value in data['counters']:
+            counters[name, label_key(dict(labels))] += value
+        for name, labels, buckets, total, count in data['histograms']:
+            key = (name, label_key(dict(labels)))
+            merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+    return counters, histograms
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# Текстовый формат Prometheus (exposition format 0.0.4)
+def render_metrics():
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, description, bounds) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+            continue
+        for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket in zip([*bounds, '+Inf'], buckets):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{format_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_value(total)}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unresolved'
+
+
+# Обертка выполнения запросов к базе (connection.execute_wrapper): число и время запросов за время
+# обработки запроса, медленные запросы пишутся в журнал usemytime.slow_queries вместе с представлением
+class QueryStats:
+    def __init__(self, request):
+        self.request = request
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD', None)
+            if threshold is not None and duration >= threshold:
+                view = view_name(self.request)
+                inc('usemytime_slow_queries_total', {'view': view})
+                slow_query_logger.warning('Медленный запрос %.3f с, представление %s (%s %s): %s',
+                                          duration, view, self.request.method, self.request.path, sql)
+
+
+# Промежуточный слой сбора метрик, стоит первым в MIDDLEWARE, чтобы учитывались и запросы остальных слоев
+# Только синхронный: под ASGI Django выполняет его в том же потоке, что и синхронные представления,
+# поэтому обертка запросов к базе видит их запросы
+# Для потоковых ответов учитывается время до начала отправки
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats(request)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        labels = {'view': view_name(request), 'method': request.method}
+        observe('usemytime_request_duration_seconds', duration, labels)
+        inc('usemytime_responses_total', {**labels, 'status': response.status_code})
+        inc('usemytime_db_queries_total', labels, stats.count)
+        inc('usemytime_db_query_duration_seconds_total', labels, stats.duration)
+        flush()
+        return response
+
+
+# Эндпоинт метрик для Prometheus, только для сотрудников (is_staff)
+def metrics_view(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,6 +1,13 @@
 from django.contrib import admin
-from .models import Task, Project
+from .models import Task, Project, TimeEntry
 
 # Добавление задач и проектов в админку
 admin.site.register(Task)
 admin.site.register(Project)
+
+# Журнал учета времени
+@admin.register(TimeEntry)
+class TimeEntryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'project', 'program', 'started_at', 'ended_at']
+    list_filter = ['program']
+    raw_id_fields = ['user', 'project']
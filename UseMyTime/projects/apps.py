@@ -37,4 +37,4 @@ class ProjectsConfig(AppConfig):
     # Выполнение создания тестовых данных
     def ready(self):
         #post_migrate.connect(create_test_data, sender=self)
-        pass
\ No newline at end of file
+        from . import signals  # noqa: F401
\ No newline at end of file
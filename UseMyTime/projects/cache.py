@@ -0,0 +1,89 @@
+from uuid import uuid4
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from .models import ActiveProject
+
+# Состояние таймера хранится до явного сброса, срок - лишь страховка от устаревших записей
+TIMER_STATE_TIMEOUT = 60 * 60 * 24
+# Фрагменты оформления страницы (шапка, меню, выбор программы) живут столько же
+PAGE_CHROME_TIMEOUT = 60 * 60 * 24
+# Версии данных для кэша отчетов: после истечения отчеты просто формируются заново
+USER_DATA_VERSION_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def timer_state_key(user_id):
+    return f'timer-state:{user_id}'
+
+
+# Активный проект пользователя (с выбранным проектом) или None
+# Обычно он уже загружен вместе с пользователем сессии (UsernameOrEmailBackend.get_user) и запроса нет;
+# после изменения таймера в том же запросе загруженный объект устарел, тогда reload=True
+# request.user - ленивая обертка (SimpleLazyObject), поэтому дескриптор берется у модели, а не у type(user)
+def get_active_project(user, reload=False):
+    if not reload and get_user_model().active_project.is_cached(user):
+        active_project = getattr(user, 'active_project', None)
+        return active_project if active_project is not None and active_project.project_id else None
+    return ActiveProject.objects.filter(user=user, project__isnull=False).select_related('project').first()
+
+
+# Состояние активного проекта пользователя для шапки страницы
+# При попадании в кэш обращений к базе нет
+def get_timer_state(user, reload=False):
+    key = timer_state_key(user.pk)
+    state = cache.get(key)
+    if state is None:
+        active_project = get_active_project(user, reload)
+        state = {
+            'project_id': active_project.project_id if active_project else None,
+            'project_title': active_project.project.title if active_project else '',
+            'in_work': active_project.in_work if active_project else False,
+            'started_at': active_project.last_started_at if active_project else None,
+        }
+        cache.set(key, state, TIMER_STATE_TIMEOUT)
+    return state
+
+
+# Сброс состояния таймера после любого его изменения
+def invalidate_timer_state(user_id):
+    cache.delete(timer_state_key(user_id))
+
+
+def page_chrome_version_key(user_id):
+    return f'page-chrome-version:{user_id}'
+
+
+# Версия фрагментов оформления страницы пользователя
+# Входит в ключ фрагментов, поэтому смена версии делает все старые фрагменты недоступными
+def get_page_chrome_version(user_id):
+    key = page_chrome_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        cache.set(key, version, PAGE_CHROME_TIMEOUT)
+    return version
+
+
+# Сброс фрагментов оформления после изменения проектов, программ или профиля пользователей
+def invalidate_page_chrome(*user_ids):
+    cache.delete_many([page_chrome_version_key(user_id) for user_id in user_ids])
+
+
+def user_data_version_key(user_id):
+    return f'user-data-version:{user_id}'
+
+
+# Версии данных пользователей (проекты, задачи, учтенное время, профиль) для кэша отчетов
+# Недостающие версии создаются одной записью в кэш
+def get_user_data_versions(user_ids):
+    keys = {user_data_version_key(user_id): user_id for user_id in user_ids}
+    versions = {keys[key]: version for key, version in cache.get_many(keys).items()}
+    missing = {key: uuid4().hex for key, user_id in keys.items() if user_id not in versions}
+    if missing:
+        cache.set_many(missing, USER_DATA_VERSION_TIMEOUT)
+        versions.update({keys[key]: version for key, version in missing.items()})
+    return versions
+
+
+# Сброс версии данных пользователей, все отчеты с их данными перестают читаться из кэша
+def invalidate_user_data(*user_ids):
+    cache.delete_many([user_data_version_key(user_id) for user_id in user_ids])
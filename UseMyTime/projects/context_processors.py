@@ -0,0 +1,20 @@
+from django.utils.functional import SimpleLazyObject
+from .models import Project
+from .cache import PAGE_CHROME_TIMEOUT, get_page_chrome_version, get_timer_state
+
+
+# Состояние таймера для шапки страницы (загружается только при обращении из шаблона)
+def timer(request):
+    if not request.user.is_authenticated:
+        return {}
+    return {'timer': SimpleLazyObject(lambda: get_timer_state(request.user))}
+
+
+# Версия кэша фрагментов оформления страницы (шапка, меню проектов, выбор программы)
+# Список проектов для меню - ленивый запрос, он выполняется только при промахе кэша
+def page_chrome(request):
+    if not request.user.is_authenticated:
+        return {}
+    return {'page_chrome': SimpleLazyObject(lambda: {'version': get_page_chrome_version(request.user.pk),
+                                                     'timeout': PAGE_CHROME_TIMEOUT}),
+            'sidebar_projects': Project.objects.filter(user=request.user, is_archived=False).only('id', 'title')}
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+
+# Внутрипроцессная рассылка изменений таймеров
+# Подписчики - потоки событий (SSE), работающие в цикле событий ASGI-сервера,
+# публикация идет из обычных (синхронных) представлений через call_soon_threadsafe.
+# Рассылка работает только в пределах одного процесса, поэтому приложение
+# должно обслуживаться одним процессом ASGI-сервера (см. asgi.py): при нескольких воркерах
+# событие, опубликованное в одном процессе, не дойдет до потоков, открытых в другом.
+# Для нескольких процессов нужен общий брокер (например, Redis pub/sub), он не реализован.
+# Под WSGI (gunicorn) поток событий выключен (accounts.views.team_stream_enabled)
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_subscriptions = set()
+_lock = threading.Lock()
+
+
+class Subscription:
+    def __init__(self, user_ids):
+        self.user_ids = frozenset(user_ids)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def put(self, event):
+        # Медленный клиент не должен копить события бесконечно
+        if not self.queue.full():
+            self.queue.put_nowait(event)
+
+
+# Подписка на изменения таймеров указанных пользователей (на время жизни потока событий)
+@contextmanager
+def subscribe(user_ids):
+    subscription = Subscription(user_ids)
+    with _lock:
+        _subscriptions.add(subscription)
+    try:
+        yield subscription
+    finally:
+        with _lock:
+            _subscriptions.discard(subscription)
+
+
+def has_subscribers(user_id):
+    with _lock:
+        return any(user_id in subscription.user_ids for subscription in _subscriptions)
+
+
+def publish(event):
+    with _lock:
+        subscriptions = [s for s in _subscriptions if event['user_id'] in s.user_ids]
+    for subscription in subscriptions:
+        try:
+            subscription.loop.call_soon_threadsafe(subscription.put, event)
+        except RuntimeError:
+            # Цикл событий подписчика уже закрыт
+            pass
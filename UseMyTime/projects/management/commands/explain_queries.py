@@ -0,0 +1,125 @@
+import re
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from accounts.models import Profile
+from projects.models import ActiveProject, DailyTime, Project, Task, TimerEvent
+
+# Признаки полного просмотра таблицы в плане запроса
+# SQLite: "SCAN <таблица>" без использования индекса, PostgreSQL: "Seq Scan on <таблица>"
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?!.*\bUSING\b)'),
+    'postgresql': re.compile(r'\bSeq Scan on\b'),
+}
+
+
+# Основные запросы приложения и индексы, которые они должны использовать
+# Индекс задается именем или моделью и столбцами (для индексов внешних ключей и уникальных полей,
+# имена которых Django и база генерируют сами); значения параметров не важны, важен только план
+def get_hot_queries():
+    today = timezone.localdate()
+    now = timezone.now()
+    return {
+        'Меню и отчеты: неархивные проекты пользователя': (
+            Project.objects.filter(user_id=1, is_archived=False),
+            [(Project, 'user_id')]),
+        'Архив проектов (страница после курсора)': (
+            Project.objects.filter(user_id=1, is_archived=True).filter(created_at__gt=now)
+                           .order_by('created_at', 'pk')[:21],
+            ['project_archive_page_idx']),
+        'Задачи проекта (страница после курсора)': (
+            Task.objects.filter(project_id=1, created_at__gt=now).order_by('created_at', 'pk')[:101],
+            [(Task, 'project_id', 'created_at', 'id')]),
+        'Отчеты: последняя выполненная задача проекта': (
+            Task.objects.filter(project_id=1, is_done=True).order_by('-created_at')[:1],
+            ['task_done_idx']),
+        'Вход по логину или почте': (
+            User.objects.filter(Q(username='user@example.com') | Q(email__iexact='user@example.com')),
+            [(User, 'username'), 'accounts_auth_user_email_iexact_idx']),
+        'Поиск сотрудника по фамилии': (
+            Profile.objects.filter(search_last_name__startswith='ив'),
+            ['accounts_profile_search_last_name_idx']),
+        'Поиск сотрудника по должности': (
+            Profile.objects.filter(search_position__startswith='ин'),
+            ['accounts_profile_search_position_idx']),
+        'Мой отдел: таймеры сотрудников': (
+            ActiveProject.objects.filter(user__profile__manager_id=1, project__isnull=False),
+            [(Profile, 'manager_id'), (ActiveProject, 'user_id')]),
+        'Синхронизация таймера: последнее примененное событие': (
+            TimerEvent.objects.filter(user_id=1, is_applied=True).values('user').annotate(last_at=Max('occurred_at')),
+            [(TimerEvent, 'user_id', 'occurred_at')]),
+        'Недельные итоги': (
+            DailyTime.objects.filter(user_id=1).for_week(today),
+            [(DailyTime, 'user_id', 'day')]),
+        'Отчет за период: время проекта': (
+            DailyTime.objects.filter(project_id=1, day__range=(today - timedelta(days=30), today)),
+            [(DailyTime, 'project_id', 'day')]),
+        'Отчет за период: выполненные задачи': (
+            Task.objects.filter(project_id=1, is_done=True,
+                                created_at__gte=now - timedelta(days=30), created_at__lt=now),
+            ['task_done_idx']),
+    }
+
+
+# Имя индекса по модели и столбцам (по описанию индексов и ограничений из базы)
+# Индексы уникальных полей SQLite называет sqlite_autoindex_..., а в описании ограничений этих имен нет,
+# поэтому для SQLite индексы перебираются через PRAGMA
+def find_index_name(cursor, model, *columns):
+    table = model._meta.db_table
+    if connection.vendor == 'sqlite':
+        cursor.execute(f'PRAGMA index_list({connection.ops.quote_name(table)})')
+        for name in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f'PRAGMA index_info({connection.ops.quote_name(name)})')
+            if [row[2] for row in cursor.fetchall()] == list(columns):
+                return name
+        return None
+    constraints = connection.introspection.get_constraints(cursor, table)
+    for name, constraint in constraints.items():
+        if (constraint['index'] or constraint['unique']) and constraint['columns'] == list(columns):
+            return name
+    return None
+
+
+# Проверка покрытия индексами: EXPLAIN для каждого запроса, поиск полных просмотров таблиц
+# и проверка, что в плане есть ожидаемые индексы (иначе индекс мог бы быть создан, но не использоваться)
+class Command(BaseCommand):
+    help = 'Выполняет EXPLAIN для основных запросов и проверяет, что они используют ожидаемые индексы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Выводить план каждого запроса целиком')
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'EXPLAIN не поддерживается для {connection.vendor}')
+
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # На маленьких таблицах PostgreSQL выбирает полный просмотр даже при наличии индекса,
+                # поэтому он запрещается: оставшийся Seq Scan означает, что подходящего индекса нет
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, (queryset, expected) in get_hot_queries().items():
+                with connection.cursor() as cursor:
+                    expected = [index if isinstance(index, str) else find_index_name(cursor, *index)
+                                for index in expected]
+                plan = queryset.explain()
+                missing = [str(index) for index in expected if index is None or index not in plan]
+                problems = (['полный просмотр таблицы'] if pattern.search(plan) else []) + \
+                           [f'не используется индекс {index}' for index in missing]
+                if problems:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f'НЕТ ИНДЕКСА  {name}: {", ".join(problems)}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'индекс       {name}'))
+                if options['verbose_plans'] or problems:
+                    self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f'Запросов без ожидаемого индекса: {len(failures)}')
+        self.stdout.write(self.style.SUCCESS('Все запросы используют ожидаемые индексы'))
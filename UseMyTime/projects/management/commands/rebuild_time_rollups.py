@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from projects.cache import invalidate_user_data
+from projects.models import DailyTime
+
+
+# Полный пересчет дневных сводок времени по журналу учета времени
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные сводки времени (DailyTime) по журналу учета времени (TimeEntry)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Размер пакета при чтении журнала и записи сводок')
+
+    # Отчеты в кэше строились по старым сводкам, поэтому версии данных пользователей
+    # (и тех, у кого сводки были, и тех, у кого они появились) сбрасываются после пересчета
+    def handle(self, *args, **options):
+        user_ids = set(DailyTime.objects.order_by().values_list('user_id', flat=True).distinct())
+        count = DailyTime.objects.rebuild(batch_size=options['batch_size'])
+        user_ids.update(DailyTime.objects.order_by().values_list('user_id', flat=True).distinct())
+        invalidate_user_data(*user_ids)
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано дневных сводок: {count}'))
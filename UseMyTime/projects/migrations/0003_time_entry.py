@@ -0,0 +1,65 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:30
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Перенос накопленного времени проектов в журнал учета времени
+# Время по программам переносится отдельными записями, остаток - записью без программы
+def move_totals_to_entries(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    ProjectProgram = apps.get_model('projects', 'ProjectProgram')
+    TimeEntry = apps.get_model('projects', 'TimeEntry')
+    entries = []
+    for project in Project.objects.exclude(total_time=datetime.timedelta(0)).iterator():
+        rest = project.total_time
+        for project_program in ProjectProgram.objects.filter(project=project).exclude(total_time=datetime.timedelta(0)):
+            rest -= project_program.total_time
+            entries.append(TimeEntry(user_id=project.user_id,
+                                     project=project,
+                                     program_id=project_program.program_id,
+                                     started_at=project.created_at,
+                                     ended_at=project.created_at + project_program.total_time))
+        if rest > datetime.timedelta(0):
+            entries.append(TimeEntry(user_id=project.user_id,
+                                     project=project,
+                                     started_at=project.created_at,
+                                     ended_at=project.created_at + rest))
+    TimeEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_alter_activeproject_user_and_more'),
+        ('work_programs', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('program', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='time_entries', to='work_programs.workprogram')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='time_entries', to='projects.project')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='time_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'started_at'], name='projects_ti_user_id_3c399d_idx'), models.Index(fields=['project', 'program'], name='projects_ti_project_f25335_idx')],
+            },
+        ),
+        migrations.RunPython(move_totals_to_entries, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='project',
+            name='total_time',
+        ),
+        migrations.RemoveField(
+            model_name='projectprogram',
+            name='total_time',
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:32
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from collections import defaultdict
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Копия projects.models.split_by_days на момент миграции: миграция не должна зависеть от текущего кода моделей
+def split_by_days(started_at, ended_at):
+    start = timezone.localtime(started_at)
+    end = timezone.localtime(ended_at)
+    while start < end:
+        next_day = timezone.make_aware(datetime.datetime.combine(start.date() + datetime.timedelta(days=1),
+                                                                 datetime.time.min))
+        part_end = min(end, next_day)
+        yield start.date(), part_end - start
+        start = part_end
+
+
+# Заполнение дневных сводок по уже накопленному журналу учета времени
+def fill_daily_times(apps, schema_editor):
+    TimeEntry = apps.get_model('projects', 'TimeEntry')
+    DailyTime = apps.get_model('projects', 'DailyTime')
+    totals = defaultdict(datetime.timedelta)
+    entries = TimeEntry.objects.values_list('user_id', 'project_id', 'program_id', 'started_at', 'ended_at')
+    for user_id, project_id, program_id, started_at, ended_at in entries.iterator():
+        for day, duration in split_by_days(started_at, ended_at):
+            totals[user_id, project_id, program_id, day] += duration
+    DailyTime.objects.bulk_create([DailyTime(user_id=user_id, project_id=project_id, program_id=program_id,
+                                             day=day, total_time=total_time)
+                                   for (user_id, project_id, program_id, day), total_time in totals.items()],
+                                  batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_time_entry'),
+        ('work_programs', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTime',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total_time', models.DurationField(default=datetime.timedelta(0))),
+                ('program', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_times', to='work_programs.workprogram')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_times', to='projects.project')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_times', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'day'], name='projects_da_user_id_eb4a90_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('program__isnull', False)), fields=('user', 'project', 'program', 'day'), name='daily_time_unique_program_day'), models.UniqueConstraint(condition=models.Q(('program__isnull', True)), fields=('user', 'project', 'day'), name='daily_time_unique_day')],
+            },
+        ),
+        migrations.RunPython(fill_daily_times, migrations.RunPython.noop),
+    ]
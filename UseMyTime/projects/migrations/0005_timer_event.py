@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_daily_time'),
+        ('work_programs', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimerEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_id', models.CharField(max_length=64)),
+                ('kind', models.CharField(choices=[('start', 'Старт'), ('stop', 'Стоп'), ('switch', 'Смена программы')], max_length=10)),
+                ('occurred_at', models.DateTimeField()),
+                ('is_applied', models.BooleanField(default=False)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('program', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='work_programs.workprogram')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timer_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'occurred_at'], name='projects_ti_user_id_a070a0_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'client_id'), name='timer_event_unique_client_id')],
+            },
+        ),
+    ]
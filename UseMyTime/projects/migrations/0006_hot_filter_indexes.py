@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_timer_event'),
+        ('work_programs', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activeproject',
+            index=models.Index(condition=models.Q(('in_work', True)), fields=['user', 'last_started_at'], name='active_project_in_work_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['user', 'is_archived'], name='projects_pr_user_id_1d795e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'is_done', 'created_at'], name='projects_ta_project_df54d1_idx'),
+        ),
+    ]
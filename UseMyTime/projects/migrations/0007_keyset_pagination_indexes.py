@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_hot_filter_indexes'),
+        ('work_programs', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='project',
+            name='projects_pr_user_id_1d795e_idx',
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['user', 'is_archived', 'created_at', 'id'], name='projects_pr_user_id_7a4fd3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'created_at', 'id'], name='projects_ta_project_4b0be8_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_keyset_pagination_indexes'),
+        ('work_programs', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailytime',
+            index=models.Index(fields=['project', 'day'], name='projects_da_project_692e20_idx'),
+        ),
+    ]
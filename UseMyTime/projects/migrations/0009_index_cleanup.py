@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_daily_time_project_day_index'),
+        ('work_programs', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='activeproject',
+            name='active_project_in_work_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='project',
+            name='projects_pr_user_id_7a4fd3_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='projects_ta_project_df54d1_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='timeentry',
+            name='projects_ti_user_id_3c399d_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='timeentry',
+            name='projects_ti_project_f25335_idx',
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(condition=models.Q(('is_archived', True)), fields=['user', 'created_at', 'id'], name='project_archive_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_done', True)), fields=['project', 'created_at'], name='task_done_idx'),
+        ),
+    ]
@@ -1,10 +1,69 @@
-from django.db import models
+from collections import defaultdict
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 from work_programs.models import WorkProgram
-from datetime import timedelta
+from datetime import datetime, time, timedelta
+
+# Длительность одной записи учета времени (вычисляется в SQL)
+ENTRY_DURATION = F('ended_at') - F('started_at')
+
+
+# Разбиение сессии на части по календарным дням (в часовом поясе проекта)
+def split_by_days(started_at, ended_at):
+    start = timezone.localtime(started_at)
+    end = timezone.localtime(ended_at)
+    while start < end:
+        next_day = timezone.make_aware(datetime.combine(start.date() + timedelta(days=1), time.min))
+        part_end = min(end, next_day)
+        yield start.date(), part_end - start
+        start = part_end
+
+
+# Суммарное время из дневных сводок, отобранных по внешнему ключу из запроса
+def tracked_time_subquery(**filters):
+    rows = DailyTime.objects.filter(**filters).order_by()
+    total = rows.values('project').annotate(total=Sum('total_time')).values('total')
+    return Coalesce(Subquery(total, output_field=models.DurationField()),
+                    models.Value(timedelta(0)))
+
+
+# Модель с временем, вычисляемым из дневных сводок журнала учета времени
+# Значение можно заранее подставить аннотацией total_time в запросе
+class TrackedTimeMixin:
+    @property
+    def total_time(self):
+        if not hasattr(self, '_total_time'):
+            total = self.get_daily_times().aggregate(total=Sum('total_time'))['total']
+            self._total_time = total or timedelta(0)
+        return self._total_time
+
+    @total_time.setter
+    def total_time(self, value):
+        self._total_time = value or timedelta(0)
+
+    def get_hours_minutes_seconds(self):
+        seconds = int(self.total_time.total_seconds())
+        return [seconds // 3600, (seconds % 3600) // 60, seconds % 60]  # [hours, minutes, seconds]
+
+
+class ProjectQuerySet(models.QuerySet):
+    # Подстановка общего времени одним подзапросом вместо запроса на каждый проект
+    # Дополнительные условия отбирают сводки, например за период: with_total_time(day__gte=...)
+    def with_total_time(self, **filters):
+        return self.annotate(total_time=tracked_time_subquery(project=OuterRef('pk'), **filters))
+
+
+class ProjectProgramQuerySet(models.QuerySet):
+    def with_total_time(self):
+        return self.annotate(total_time=tracked_time_subquery(project=OuterRef('project'),
+                                                              program=OuterRef('program')))
 
 # Модель проектов
-class Project(models.Model):
+# Общее время работы вычисляется из дневных сводок (DailyTime)
+class Project(TrackedTimeMixin, models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE,
                              related_name='projects')
@@ -12,31 +71,42 @@ class Project(models.Model):
     description = models.TextField(verbose_name='Описание проекта')
     created_at = models.DateTimeField(auto_now_add=True)
     is_archived = models.BooleanField(default=False)
-    total_time = models.DurationField(default=timedelta(0))
     programs = models.ManyToManyField(
         WorkProgram,
         through='ProjectProgram',
         through_fields=['project', 'program']
     )
 
-    def get_hours_minutes_seconds(self):
-        seconds = int(self.total_time.total_seconds())
-        return [seconds // 3600, (seconds % 3600) // 60, seconds % 60]  # [hours, minutes, seconds]
+    objects = ProjectQuerySet.as_manager()
+
+    def get_daily_times(self):
+        return self.daily_times.all()
+
+    class Meta:
+        # Постраничный обход архива по (created_at, id); частичный, потому что логическое поле
+        # SQLite не использует как условие равенства и иначе сортировал бы архив без индекса
+        # Неархивные проекты пользователя (меню, отчеты) выбираются по индексу внешнего ключа user
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'],
+                         condition=Q(is_archived=True),
+                         name='project_archive_page_idx'),
+        ]
 
 # Промежуточная модель между программами и проектами
-# Хранит время работы над проектом для каждой программы
-class ProjectProgram(models.Model):
+# Время работы над проектом для каждой программы вычисляется из дневных сводок
+class ProjectProgram(TrackedTimeMixin, models.Model):
     program = models.ForeignKey(WorkProgram, 
                                 on_delete=models.CASCADE,
                                 related_name='project_programs')
     project = models.ForeignKey(Project, 
                                 on_delete=models.CASCADE,
                                 related_name='project_programs')
-    total_time = models.DurationField(default=timedelta(0))
 
-    def get_hours_minutes_seconds(self):
-        seconds = int(self.total_time.total_seconds())
-        return [seconds // 3600, (seconds % 3600) // 60, seconds % 60] # [hours, minutes, seconds]
+    objects = ProjectProgramQuerySet.as_manager()
+
+    def get_daily_times(self):
+        return DailyTime.objects.filter(project_id=self.project_id,
+                                        program_id=self.program_id)
 
 # Модель активного проекта
 # Для него и будет учитываться время
@@ -60,4 +130,153 @@ class Task(models.Model):
                                 related_name='tasks')
     text = models.TextField(verbose_name='Текст задачи')
     is_done = models.BooleanField(default=False, verbose_name='Выполнено')
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Выполненные задачи проекта для отчетов (за период и последняя выполненная), страница задач по курсору
+        indexes = [
+            models.Index(fields=['project', 'created_at'],
+                         condition=Q(is_done=True),
+                         name='task_done_idx'),
+            models.Index(fields=['project', 'created_at', 'id']),
+        ]
+
+# Журнал учета времени
+# Каждая остановка таймера добавляет одну запись, существующие записи не изменяются
+# Журнал читается только целиком (rebuild_time_rollups), поэтому индексов кроме внешних ключей нет
+class TimeEntry(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE,
+                             related_name='time_entries')
+    project = models.ForeignKey(Project,
+                                on_delete=models.CASCADE,
+                                related_name='time_entries')
+    program = models.ForeignKey(WorkProgram,
+                                on_delete=models.SET_NULL,
+                                null=True, blank=True,
+                                related_name='time_entries')
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+
+    @property
+    def duration(self):
+        return self.ended_at - self.started_at
+
+
+class DailyTimeQuerySet(models.QuerySet):
+    # Добавление сессии к сводкам: по одному инкременту на каждый затронутый день
+    def add_entry(self, entry):
+        for day, duration in split_by_days(entry.started_at, entry.ended_at):
+            key = {'user_id': entry.user_id,
+                   'project_id': entry.project_id,
+                   'program_id': entry.program_id,
+                   'day': day}
+            if self.filter(**key).update(total_time=F('total_time') + duration):
+                continue
+            try:
+                with transaction.atomic():
+                    self.create(total_time=duration, **key)
+            except IntegrityError:
+                # Строку за этот день успел создать параллельный запрос
+                self.filter(**key).update(total_time=F('total_time') + duration)
+
+    # Полный пересчет сводок по журналу учета времени
+    def rebuild(self, batch_size=1000):
+        totals = defaultdict(timedelta)
+        entries = TimeEntry.objects.order_by().values_list('user_id', 'project_id', 'program_id',
+                                                           'started_at', 'ended_at')
+        for user_id, project_id, program_id, started_at, ended_at in entries.iterator(chunk_size=batch_size):
+            for day, duration in split_by_days(started_at, ended_at):
+                totals[user_id, project_id, program_id, day] += duration
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create((DailyTime(user_id=user_id, project_id=project_id, program_id=program_id,
+                                        day=day, total_time=total_time)
+                              for (user_id, project_id, program_id, day), total_time in totals.items()),
+                             batch_size=batch_size)
+        return len(totals)
+
+    # Перенос сводок удаляемой программы в сводки без программы
+    def fold_program(self, program):
+        for row in self.filter(program=program):
+            merged = self.filter(user_id=row.user_id, project_id=row.project_id,
+                                 program=None, day=row.day).update(total_time=F('total_time') + row.total_time)
+            if merged:
+                row.delete()
+            else:
+                row.program = None
+                row.save(update_fields=['program'])
+
+    # Сводки за неделю, содержащую указанный день (с понедельника по воскресенье)
+    def for_week(self, day):
+        monday = day - timedelta(days=day.weekday())
+        return self.filter(day__range=(monday, monday + timedelta(days=6)))
+
+    def total(self):
+        return self.aggregate(total=Sum('total_time'))['total'] or timedelta(0)
+
+
+# Дневные сводки времени по пользователю, проекту и программе
+# Обновляются при каждой остановке таймера, полностью пересчитываются командой rebuild_time_rollups
+class DailyTime(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE,
+                             related_name='daily_times')
+    project = models.ForeignKey(Project,
+                                on_delete=models.CASCADE,
+                                related_name='daily_times')
+    program = models.ForeignKey(WorkProgram,
+                                on_delete=models.SET_NULL,
+                                null=True, blank=True,
+                                related_name='daily_times')
+    day = models.DateField()
+    total_time = models.DurationField(default=timedelta(0))
+
+    objects = DailyTimeQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'project', 'program', 'day'],
+                                    condition=Q(program__isnull=False),
+                                    name='daily_time_unique_program_day'),
+            models.UniqueConstraint(fields=['user', 'project', 'day'],
+                                    condition=Q(program__isnull=True),
+                                    name='daily_time_unique_day'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day']),
+            # Время проекта за период в отчетах (просмотр только сводок периода)
+            models.Index(fields=['project', 'day']),
+        ]
+
+
+# Типы событий таймера, присылаемых клиентом пакетами
+TIMER_EVENT_CHOICES = (
+    ('start', 'Старт'),
+    ('stop', 'Стоп'),
+    ('switch', 'Смена программы'),
+)
+
+# Обработанные события таймера
+# Идентификатор события задает клиент, повторно присланные события отбрасываются
+class TimerEvent(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE,
+                             related_name='timer_events')
+    client_id = models.CharField(max_length=64)
+    kind = models.CharField(max_length=10, choices=TIMER_EVENT_CHOICES)
+    program = models.ForeignKey(WorkProgram,
+                                on_delete=models.SET_NULL,
+                                null=True, blank=True)
+    occurred_at = models.DateTimeField()
+    is_applied = models.BooleanField(default=False)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'client_id'],
+                                    name='timer_event_unique_client_id'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'occurred_at']),
+        ]
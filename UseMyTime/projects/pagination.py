@@ -0,0 +1,40 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from django.db.models import Q
+
+# Размеры страниц архива проектов и списка задач
+ARCHIVE_PAGE_SIZE = 20
+TASKS_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# Курсор - позиция последней показанной записи (created_at, id) в виде строки для URL
+def encode_cursor(obj):
+    value = f'{obj.created_at.isoformat()}|{obj.pk}'
+    return urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        value = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = value.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError) as error:
+        raise InvalidCursor(cursor) from error
+
+
+# Страница записей по ключу (created_at, id)
+# Вместо OFFSET выбираются записи строго после курсора, поэтому глубина прокрутки не влияет на скорость,
+# а добавленные во время прокрутки записи не сдвигают страницы
+# Лишняя запись выбирается только для того, чтобы узнать, есть ли следующая страница
+def keyset_page(queryset, cursor=None, page_size=TASKS_PAGE_SIZE):
+    queryset = queryset.order_by('created_at', 'pk')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+    items = list(queryset[:page_size + 1])
+    next_cursor = encode_cursor(items[page_size - 1]) if len(items) > page_size else None
+    return items[:page_size], next_cursor
@@ -0,0 +1,66 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.conf import settings
+from accounts.models import Profile
+from work_programs.models import WorkProgram
+from .cache import invalidate_page_chrome, invalidate_user_data
+from .models import DailyTime, Project, ProjectProgram, Task
+
+
+# При удалении программы ее время остается в проекте как время без программы
+@receiver(pre_delete, sender=WorkProgram)
+def fold_program_daily_times(sender, instance, **kwargs):
+    DailyTime.objects.fold_program(instance)
+
+
+# Меню проектов строится из кэша, поэтому любое изменение проекта сбрасывает кэш его владельца
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def project_changed(sender, instance, **kwargs):
+    invalidate_page_chrome(instance.user_id)
+    invalidate_user_data(instance.user_id)
+
+
+# Задачи и программы проекта входят в отчеты владельца проекта
+# Массовые изменения задач (update, bulk_create, удаление в форме проекта) сбрасывают версию явно
+# в представлениях: обработчик post_delete для задач выполнял бы запрос на каждую удаляемую задачу
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=ProjectProgram)
+@receiver(post_delete, sender=ProjectProgram)
+def project_content_changed(sender, instance, **kwargs):
+    invalidate_user_data(*Project.objects.filter(pk=instance.project_id).values_list('user_id', flat=True))
+
+
+# Переименование или удаление программы меняет окно выбора программы у всех ее пользователей
+@receiver(post_save, sender=WorkProgram)
+@receiver(pre_delete, sender=WorkProgram)
+def work_program_changed(sender, instance, **kwargs):
+    invalidate_page_chrome(*instance.users.values_list('pk', flat=True))
+
+
+# Изменение списка выбранных программ (с любой стороны связи)
+@receiver(m2m_changed, sender=WorkProgram.users.through)
+def work_program_users_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        invalidate_page_chrome(instance.pk)
+    elif action == 'pre_clear':
+        invalidate_page_chrome(*instance.users.values_list('pk', flat=True))
+    else:
+        invalidate_page_chrome(*pk_set)
+
+
+# Фото, отчество и роль из профиля показываются в шапке и меню, должность и начальник - в отчетах
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_page_chrome(instance.user_id)
+    invalidate_user_data(instance.user_id)
+
+
+# Имя и почта пользователя тоже входят в шапку и отчеты
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    invalidate_page_chrome(instance.pk)
+    invalidate_user_data(instance.pk)
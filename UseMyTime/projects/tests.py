@@ -1,3 +1,337 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from projects.cache import get_user_data_versions
+from projects.models import (ActiveProject, DailyTime, DailyTimeQuerySet, Project, ProjectProgram, Task,
+                             TimeEntry, TimerEvent, split_by_days)
+from work_programs.models import WorkProgram
 
-# Create your tests here.
+
+# Количество запросов при сохранении проекта не зависит от количества задач
+class ProjectTasksSaveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+        self.client.force_login(self.user)
+
+    def count_queries(self, url, tasks):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(url, {'title': 'Проект',
+                                              'description': 'Описание',
+                                              'tasks': tasks})
+        self.assertEqual(response.status_code, 302)
+        return len(context.captured_queries)
+
+    def test_create_query_count_is_constant(self):
+        small = self.count_queries(reverse('project_create'), [f'Задача {i}' for i in range(5)])
+        large = self.count_queries(reverse('project_create'), [f'Задача {i}' for i in range(200)])
+        self.assertEqual(small, large)
+        self.assertEqual(Task.objects.count(), 205)
+
+    def test_update_query_count_is_constant(self):
+        project = Project.objects.create(user=self.user, title='Проект', description='Описание')
+        url = reverse('project_update', kwargs={'pk': project.pk})
+        Task.objects.bulk_create([Task(project=project, text=f'Задача {i}') for i in range(5)])
+        small = self.count_queries(url, [f'Задача {i}' for i in range(3, 10)])
+        Task.objects.bulk_create([Task(project=project, text=f'Старая задача {i}') for i in range(200)])
+        large = self.count_queries(url, [f'Задача {i}' for i in range(100, 300)])
+        self.assertEqual(small, large)
+
+    def test_update_keeps_matching_tasks(self):
+        project = Project.objects.create(user=self.user, title='Проект', description='Описание')
+        kept = Task.objects.create(project=project, text='Оставить', is_done=True)
+        Task.objects.create(project=project, text='Удалить')
+        self.count_queries(reverse('project_update', kwargs={'pk': project.pk}),
+                           ['Оставить', 'Новая', 'Новая', ' '])
+        self.assertQuerySetEqual(project.tasks.order_by('id').values_list('text', flat=True),
+                                 ['Оставить', 'Новая'])
+        kept.refresh_from_db()
+        self.assertTrue(kept.is_done)
+
+
+# Количество запросов на странице проекта не зависит от количества задач и программ
+class ProjectDetailQueriesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(user=self.user, title='Проект', description='Описание')
+
+    def add_tasks_and_programs(self, count):
+        Task.objects.bulk_create([Task(project=self.project, text=f'Задача {i}') for i in range(count)])
+        today = timezone.localdate()
+        for i in range(count):
+            program = WorkProgram.objects.create(name=f'Программа {i}')
+            ProjectProgram.objects.create(project=self.project, program=program)
+            DailyTime.objects.create(user=self.user, project=self.project, program=program,
+                                     day=today, total_time=timedelta(minutes=i + 1, seconds=i))
+
+    def count_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('project_detail', kwargs={'pk': self.project.pk}))
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_query_count_is_constant(self):
+        self.add_tasks_and_programs(1)
+        small, _ = self.count_queries()
+        self.add_tasks_and_programs(10)
+        large, response = self.count_queries()
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.context['tasks']), 11)
+        self.assertEqual(len(response.context['program_times']), 11)
+
+    def test_program_seconds_are_its_own(self):
+        program = WorkProgram.objects.create(name='Программа')
+        ProjectProgram.objects.create(project=self.project, program=program)
+        day = timezone.localdate()
+        DailyTime.objects.create(user=self.user, project=self.project, program=program,
+                                 day=day, total_time=timedelta(minutes=1, seconds=5))
+        DailyTime.objects.create(user=self.user, project=self.project,
+                                 day=day, total_time=timedelta(seconds=20))
+        _, response = self.count_queries()
+        self.assertEqual(response.context['total_time'], [0, 1, 25])
+        self.assertEqual(response.context['program_times'], [('Программа', [0, 1, 5])])
+
+
+# Панель таймера в шапке строится по активному проекту пользователя сессии при пустом кэше
+class TimerPanelTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(user=self.user, title='Активный проект', description='Описание')
+
+    def test_panel_shows_active_project_after_activation(self):
+        response = self.client.post(reverse('projects_activate'), {'project_id': self.project.pk}, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['timer']['project_id'], self.project.pk)
+        self.assertContains(response, 'id="stop-form"')
+
+    def test_panel_is_built_on_cache_miss(self):
+        ActiveProject.objects.create(user=self.user, project=self.project)
+        cache.clear()
+        response = self.client.get(reverse('project_detail', kwargs={'pk': self.project.pk}))
+        self.assertEqual(response.context['timer']['project_title'], 'Активный проект')
+        self.assertContains(response, 'id="start-form"')
+
+
+# Архивация проекта (массовым UPDATE, без сигналов) убирает его из закэшированного меню проектов
+class ArchiveSidebarTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(user=self.user, title='Проект', description='Описание')
+        self.link = f'href="{reverse("project_detail", kwargs={"pk": self.project.pk})}"'
+        cache.clear()
+
+    def test_archive_view_invalidates_sidebar(self):
+        self.assertContains(self.client.get(reverse('project_create')), self.link)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('projects_archivate', kwargs={'id': self.project.pk}))
+        self.assertNotContains(self.client.get(reverse('project_create')), self.link)
+
+    def test_batch_archive_invalidates_sidebar(self):
+        self.assertContains(self.client.get(reverse('project_create')), self.link)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('projects_batch_update'), {'archive': [self.project.pk]},
+                             content_type='application/json')
+        self.assertNotContains(self.client.get(reverse('project_create')), self.link)
+
+
+# Смена активного проекта пакетным запросом во время работы сохраняет идущую сессию
+class BatchActivateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+        self.client.force_login(self.user)
+        self.old = Project.objects.create(user=self.user, title='Старый', description='Описание')
+        self.new = Project.objects.create(user=self.user, title='Новый', description='Описание')
+        self.started_at = timezone.now() - timedelta(hours=1)
+        active_project = ActiveProject.objects.create(user=self.user, project=self.old)
+        ActiveProject.objects.filter(pk=active_project.pk).update(in_work=True, last_started_at=self.started_at)
+
+    def activate(self, project):
+        return self.client.post(reverse('projects_batch_update'), {'activate': project.pk},
+                                content_type='application/json').json()
+
+    def test_running_session_is_recorded(self):
+        self.assertTrue(self.activate(self.new)['activated'])
+        active_project = ActiveProject.objects.get(user=self.user)
+        self.assertEqual(active_project.project, self.new)
+        self.assertFalse(active_project.in_work)
+        entry = TimeEntry.objects.get(user=self.user)
+        self.assertEqual((entry.project, entry.started_at), (self.old, self.started_at))
+        self.assertGreaterEqual(entry.ended_at - entry.started_at, timedelta(hours=1))
+
+    def test_same_project_keeps_running(self):
+        self.assertTrue(self.activate(self.old)['activated'])
+        active_project = ActiveProject.objects.get(user=self.user)
+        self.assertEqual((active_project.in_work, active_project.last_started_at), (True, self.started_at))
+        self.assertFalse(TimeEntry.objects.exists())
+
+    def test_foreign_project_is_not_activated(self):
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        foreign = Project.objects.create(user=other, title='Чужой', description='Описание')
+        self.assertFalse(self.activate(foreign)['activated'])
+        self.assertEqual(ActiveProject.objects.get(user=self.user).project, self.old)
+
+
+# Синхронизация таймера (через нее шапка отправляет все старты и остановки) ограничена по частоте
+@override_settings(THROTTLE_RATES={'timer': '2/m'})
+class TimerSyncThrottleTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def test_too_many_requests(self):
+        url = reverse('projects_timer_sync')
+        for _ in range(2):
+            response = self.client.post(url, {'events': []}, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post(url, {'events': []}, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json(), {'is_success': False, 'error': 'Too many requests'})
+        self.assertTrue(int(response['Retry-After']) > 0)
+
+
+# Пакетная синхронизация событий таймера: порядок, повторы, время событий и проверка входных данных
+class TimerSyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(user=self.user, title='Проект', description='Описание')
+        ActiveProject.objects.create(user=self.user, project=self.project)
+        self.program = WorkProgram.objects.create(name='Программа')
+        self.program.users.add(self.user)
+        self.now = timezone.now()
+        cache.clear()
+
+    def at(self, minutes_ago):
+        return int((self.now - timedelta(minutes=minutes_ago)).timestamp() * 1000)
+
+    def sync(self, *events):
+        return self.client.post(reverse('projects_timer_sync'), {'events': list(events)},
+                                content_type='application/json')
+
+    def statuses(self, response):
+        self.assertEqual(response.status_code, 200)
+        return {result['id']: result['status'] for result in response.json()['results']}
+
+    def test_events_are_applied_in_time_order(self):
+        response = self.sync({'id': 'stop', 'type': 'stop', 'at': self.at(10)},
+                             {'id': 'start', 'type': 'start', 'at': self.at(30), 'program_id': self.program.pk})
+        self.assertEqual(self.statuses(response), {'start': 'applied', 'stop': 'applied'})
+        entry = TimeEntry.objects.get(user=self.user)
+        self.assertEqual(entry.ended_at - entry.started_at, timedelta(minutes=20))
+        self.assertEqual(entry.program, self.program)
+
+    def test_duplicate_client_id_is_not_applied_twice(self):
+        start = {'id': 'start', 'type': 'start', 'at': self.at(30)}
+        self.assertEqual(self.statuses(self.sync(start, start)), {'start': 'duplicate'})
+        self.assertEqual(self.statuses(self.sync(start)), {'start': 'duplicate'})
+        self.assertEqual(TimerEvent.objects.filter(user=self.user).count(), 1)
+        self.assertTrue(ActiveProject.objects.get(user=self.user).in_work)
+
+    def test_stale_and_future_events_are_rejected(self):
+        self.statuses(self.sync({'id': 'start', 'type': 'start', 'at': self.at(10)}))
+        response = self.sync({'id': 'stale', 'type': 'stop', 'at': self.at(20)},
+                             {'id': 'future', 'type': 'stop', 'at': self.at(-60)})
+        self.assertEqual(self.statuses(response), {'stale': 'rejected', 'future': 'rejected'})
+        self.assertTrue(ActiveProject.objects.get(user=self.user).in_work)
+        self.assertFalse(TimeEntry.objects.exists())
+
+    def test_foreign_program_is_rejected(self):
+        foreign = WorkProgram.objects.create(name='Чужая программа')
+        response = self.sync({'id': 'start', 'type': 'start', 'at': self.at(1), 'program_id': foreign.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(TimerEvent.objects.exists())
+
+    def test_invalid_events_are_rejected(self):
+        invalid = [{'id': {'a': 1}, 'type': 'start', 'at': self.at(1)},
+                   {'id': ['start'], 'type': 'start', 'at': self.at(1)},
+                   {'id': True, 'type': 'start', 'at': self.at(1)},
+                   {'id': '', 'type': 'start', 'at': self.at(1)},
+                   {'id': 'x' * 65, 'type': 'start', 'at': self.at(1)},
+                   {'id': 'start', 'type': 'pause', 'at': self.at(1)},
+                   {'id': 'start', 'type': 'start', 'at': 'soon'},
+                   {'id': 'start', 'type': 'start', 'at': self.at(1), 'program_id': 'abc'}]
+        for event in invalid:
+            with self.subTest(event=event):
+                self.assertEqual(self.sync(event).status_code, 400)
+        self.assertFalse(TimerEvent.objects.exists())
+        self.assertEqual(self.statuses(self.sync({'id': 12345, 'type': 'start', 'at': self.at(1)})),
+                         {'12345': 'applied'})
+
+
+# Дневные сводки времени: разбиение по дням, параллельная вставка, перенос программы и полный пересчет
+class DailyTimeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+        self.project = Project.objects.create(user=self.user, title='Проект', description='Описание')
+        self.program = WorkProgram.objects.create(name='Программа')
+
+    def entry(self, started_at, ended_at, program=None):
+        return TimeEntry.objects.create(user=self.user, project=self.project, program=program,
+                                        started_at=started_at, ended_at=ended_at)
+
+    @override_settings(TIME_ZONE='Europe/Moscow')
+    def test_split_by_days_across_local_midnight(self):
+        # 23:30-01:00 по Москве
+        started_at = datetime(2026, 3, 1, 20, 30, tzinfo=dt_timezone.utc)
+        parts = list(split_by_days(started_at, started_at + timedelta(minutes=90)))
+        self.assertEqual(parts, [(datetime(2026, 3, 1).date(), timedelta(minutes=30)),
+                                 (datetime(2026, 3, 2).date(), timedelta(hours=1))])
+
+    def test_add_entry_merges_row_created_concurrently(self):
+        started_at = datetime(2026, 3, 1, 10, tzinfo=dt_timezone.utc)
+        DailyTime.objects.create(user=self.user, project=self.project, program=self.program,
+                                 day=started_at.date(), total_time=timedelta(minutes=5))
+        entry = self.entry(started_at, started_at + timedelta(minutes=10), self.program)
+        update = DailyTimeQuerySet.update
+        calls = []
+
+        # Первый UPDATE "не видит" строку, вставленную параллельным запросом
+        def racing_update(queryset, **kwargs):
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        with mock.patch.object(DailyTimeQuerySet, 'update', autospec=True, side_effect=racing_update):
+            DailyTime.objects.add_entry(entry)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(DailyTime.objects.get().total_time, timedelta(minutes=15))
+
+    def test_deleted_program_folds_into_time_without_program(self):
+        day, other_day = datetime(2026, 3, 1).date(), datetime(2026, 3, 2).date()
+        DailyTime.objects.create(user=self.user, project=self.project, program=self.program,
+                                 day=day, total_time=timedelta(minutes=10))
+        DailyTime.objects.create(user=self.user, project=self.project,
+                                 day=day, total_time=timedelta(minutes=5))
+        DailyTime.objects.create(user=self.user, project=self.project, program=self.program,
+                                 day=other_day, total_time=timedelta(minutes=7))
+        self.program.delete()
+        self.assertEqual(sorted(DailyTime.objects.values_list('program_id', 'day', 'total_time')),
+                         [(None, day, timedelta(minutes=15)), (None, other_day, timedelta(minutes=7))])
+
+    def test_rebuild_command_recounts_and_invalidates_reports(self):
+        started_at = datetime(2026, 3, 1, 23, tzinfo=dt_timezone.utc)
+        self.entry(started_at, started_at + timedelta(hours=2), self.program)
+        DailyTime.objects.create(user=self.user, project=self.project,
+                                 day=started_at.date(), total_time=timedelta(hours=5))
+        version = get_user_data_versions([self.user.pk])[self.user.pk]
+        call_command('rebuild_time_rollups', stdout=mock.Mock())
+        self.assertEqual(sorted(DailyTime.objects.values_list('program_id', 'day', 'total_time')),
+                         [(self.program.pk, started_at.date(), timedelta(hours=1)),
+                          (self.program.pk, started_at.date() + timedelta(days=1), timedelta(hours=1))])
+        self.assertNotEqual(get_user_data_versions([self.user.pk])[self.user.pk], version)
+
+
+# Основные запросы используют ожидаемые индексы (в том числе созданные SQL-запросом в миграциях)
+class ExplainQueriesTests(TestCase):
+    def test_hot_queries_use_expected_indexes(self):
+        call_command('explain_queries', stdout=mock.Mock())
@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.utils import timezone
+from .models import ActiveProject, ProjectProgram, TimeEntry, DailyTime
+from . import events
+from .cache import invalidate_user_data
+
+
+class TimerError(Exception):
+    pass
+
+
+# Запуск таймера активного проекта
+# Время старта задается явно, так как события могут приходить с клиента с задержкой
+def start_timer(active_project, program=None, at=None):
+    if not active_project.project_id:
+        raise TimerError('Where is not active project')
+    if active_project.in_work:
+        raise TimerError('Project is already started')
+    at = at or timezone.now()
+    # update() не затирает время старта значением auto_now
+    ActiveProject.objects.filter(pk=active_project.pk).update(current_program=program,
+                                                             in_work=True,
+                                                             last_started_at=at)
+    active_project.current_program = program
+    active_project.in_work = True
+    active_project.last_started_at = at
+    # Связь проекта с программой создается при старте, чтобы остановка оставалась одной вставкой
+    if program:
+        ProjectProgram.objects.get_or_create(program=program,
+                                             project_id=active_project.project_id)
+    publish_timer_state(active_project)
+
+
+# Остановка таймера: сессия записывается в журнал одной вставкой и добавляется в дневные сводки
+def stop_timer(active_project, at=None):
+    if not active_project.project_id:
+        raise TimerError('Where is not active project')
+    if not active_project.in_work:
+        raise TimerError('Project is already stopped')
+    at = at or timezone.now()
+    if at < active_project.last_started_at:
+        raise TimerError('Stop is earlier than start')
+    with transaction.atomic():
+        # Условное обновление не дает двум параллельным остановкам записать одну сессию дважды
+        if not ActiveProject.objects.filter(pk=active_project.pk, in_work=True).update(in_work=False):
+            raise TimerError('Project is already stopped')
+        entry = TimeEntry.objects.create(user_id=active_project.user_id,
+                                         project_id=active_project.project_id,
+                                         program_id=active_project.current_program_id,
+                                         started_at=active_project.last_started_at,
+                                         ended_at=at)
+        DailyTime.objects.add_entry(entry)
+        # Учтенное время входит в отчеты
+        user_id = active_project.user_id
+        transaction.on_commit(lambda: invalidate_user_data(user_id))
+    active_project.in_work = False
+    publish_timer_state(active_project)
+    return entry
+
+
+# Смена программы без остановки работы над проектом
+def switch_program(active_project, program, at=None):
+    at = at or timezone.now()
+    with transaction.atomic():
+        stop_timer(active_project, at)
+        start_timer(active_project, program, at)
+
+
+# Оповещение подписчиков (панель отдела у начальника) об изменении таймера
+# Если подписчиков в процессе нет, данные для события даже не собираются
+def publish_timer_state(active_project):
+    if not events.has_subscribers(active_project.user_id):
+        return
+    event = {
+        'user_id': active_project.user_id,
+        'in_work': active_project.in_work,
+        'project_id': active_project.project_id,
+        'project_title': active_project.project.title if active_project.project_id else '',
+        'program': active_project.current_program.name if active_project.current_program_id else '',
+        'started_at': int(active_project.last_started_at.timestamp()) if active_project.in_work else None,
+    }
+    transaction.on_commit(lambda: events.publish(event))
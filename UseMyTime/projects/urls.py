@@ -7,10 +7,14 @@ urlpatterns = [
     path('update/<int:pk>', views.ProjectUpdateView.as_view(), name='project_update'),
     path('delete/<int:pk>', views.ProjectDeleteView.as_view(), name='project_delete'),
     path('detail/<int:pk>', views.ProjectDetailView.as_view(), name='project_detail'),
+    path('detail/<int:pk>/tasks/', views.tasks_page, name='project_tasks_page'),
     path('archive/', views.ArchiveProjectListView.as_view(), name='projects_archive'),
+    path('archive/page/', views.archive_page, name='projects_archive_page'),
     path('archivate/<int:id>', views.project_archive, name='projects_archivate'),
     path('activate/', views.project_activate, name='projects_activate'),
     path('start/', views.project_start, name='projects_start'),
     path('stop/', views.project_stop, name='projects_stop'),
-    path('task/<int:id>', views.change_task_status, name='change_task_status')
+    path('sync/', views.timer_sync, name='projects_timer_sync'),
+    path('task/<int:id>', views.change_task_status, name='change_task_status'),
+    path('batch/', views.batch_update, name='projects_batch_update')
 ]
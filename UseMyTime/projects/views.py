@@ -1,4 +1,5 @@
 from django.shortcuts import render, HttpResponse, HttpResponseRedirect
+from django.template.loader import render_to_string
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.urls import reverse_lazy
@@ -6,8 +7,37 @@ from django.views.generic import UpdateView, CreateView, DeleteView, ListView, D
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
-from .models import Project, ProjectProgram, ActiveProject, Task
+from django.db import transaction
+from django.db.models import Case, Max, Prefetch, Value, When
+from datetime import datetime, timedelta, timezone as dt_timezone
+import json
+from .models import TIMER_EVENT_CHOICES, Project, ProjectProgram, ActiveProject, Task, TimerEvent
 from work_programs.models import WorkProgram
+from accounts.throttling import throttle
+from .cache import get_timer_state, invalidate_page_chrome, invalidate_timer_state, invalidate_user_data
+from .pagination import ARCHIVE_PAGE_SIZE, TASKS_PAGE_SIZE, InvalidCursor, keyset_page
+from .timer import TimerError, start_timer, stop_timer, switch_program, publish_timer_state
+
+# Ограничения пакетной синхронизации событий таймера
+TIMER_SYNC_MAX_EVENTS = 200
+TIMER_SYNC_CLOCK_SKEW = timedelta(minutes=5)
+TIMER_EVENT_TYPES = {kind for kind, _ in TIMER_EVENT_CHOICES}
+TIMER_EVENT_ID_LENGTH = TimerEvent._meta.get_field('client_id').max_length
+
+
+# Идентификатор события с клиента: непустая строка или целое число не длиннее поля TimerEvent.client_id
+# (объекты и списки не приводятся к строке молча, длинные идентификаторы не обрезаются)
+def timer_event_id(value):
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        raise TypeError('Invalid event id')
+    value = str(value)
+    if not value or len(value) > TIMER_EVENT_ID_LENGTH:
+        raise ValueError('Invalid event id')
+    return value
+
+# Список задач из формы: без пустых строк и повторов, в исходном порядке
+def get_tasks_texts(request):
+    return list(dict.fromkeys(t.strip() for t in request.POST.getlist('tasks') if t.strip()))
 
 # Создание проекта
 class ProjectCreateView(LoginRequiredMixin, CreateView):
@@ -16,11 +46,13 @@ class ProjectCreateView(LoginRequiredMixin, CreateView):
     fields = ['title', 'description']
     def form_valid(self, form):
         form.instance.user = self.request.user
-        project = form.save()
-        tasks_texts = [t.strip() for t in self.request.POST.getlist('tasks') if t.strip()]
-        for text in tasks_texts:
-            Task.objects.create(project=project, text=text)
-        return super().form_valid(form)
+        tasks_texts = get_tasks_texts(self.request)
+        # Проект и все его задачи создаются в одной транзакции, задачи - одной вставкой
+        with transaction.atomic():
+            self.object = form.save()
+            Task.objects.bulk_create([Task(project=self.object, text=text) for text in tasks_texts])
+        invalidate_user_data(self.request.user.pk)
+        return HttpResponseRedirect(self.get_success_url())
     def get_success_url(self):
         return reverse_lazy('project_detail', kwargs={'pk': self.object.pk})
     
@@ -34,16 +66,19 @@ class ProjectUpdateView(LoginRequiredMixin, UpdateView):
     def get_queryset(self):
         return super().get_queryset().filter(user=self.request.user)
     def form_valid(self, form):
-        project = form.save()
-        tasks_texts = [t.strip() for t in self.request.POST.getlist('tasks') if t.strip()]
-        for task in project.tasks.all():
-            if task.text not in tasks_texts:
-                task.delete()
-        existing_texts = [task.text for task in project.tasks.all()]
-        for text in tasks_texts:
-            if text not in existing_texts:
-                Task.objects.create(project=project, text=text)
-        return super().form_valid(form)
+        tasks_texts = get_tasks_texts(self.request)
+        # Синхронизация задач как разность множеств: одно удаление, одна выборка и одна вставка
+        # независимо от количества задач
+        with transaction.atomic():
+            self.object = form.save()
+            self.object.tasks.exclude(text__in=tasks_texts).delete()
+            existing_texts = set(self.object.tasks.values_list('text', flat=True))
+            Task.objects.bulk_create([Task(project=self.object, text=text)
+                                      for text in tasks_texts if text not in existing_texts])
+        # Название проекта показывается в шапке активного проекта, задачи - в отчетах
+        invalidate_timer_state(self.request.user.pk)
+        invalidate_user_data(self.request.user.pk)
+        return HttpResponseRedirect(self.get_success_url())
 
 # Удаление проекта
 class ProjectDeleteView(LoginRequiredMixin, DeleteView):
@@ -52,20 +87,86 @@ class ProjectDeleteView(LoginRequiredMixin, DeleteView):
     template_name = 'projects/delete_confirm.html'
     def get_queryset(self):
         return super().get_queryset().filter(user=self.request.user)
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        invalidate_timer_state(self.request.user.pk)
+        return response
 
 # Получение архива проектов
+# Показывается первая страница, следующие подгружаются через archive_page
 class ArchiveProjectListView(LoginRequiredMixin, ListView):
     template_name = 'projects/archive.html'
     model = Project
     def get_queryset(self):
-        return super().get_queryset().filter(user=self.request.user).filter(is_archived=True)
+        queryset = super().get_queryset().filter(user=self.request.user).filter(is_archived=True)
+        page, self.next_cursor = keyset_page(queryset, page_size=ARCHIVE_PAGE_SIZE)
+        return page
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.next_cursor
+        return context
+
+# Следующая страница архива проектов
+@login_required
+def archive_page(request):
+    queryset = Project.objects.filter(user=request.user, is_archived=True)
+    try:
+        projects, next_cursor = keyset_page(queryset, request.GET.get('cursor'), ARCHIVE_PAGE_SIZE)
+    except InvalidCursor:
+        return JsonResponse({'is_success': False,
+                             'error': 'Invalid cursor'}, status=400)
+    return JsonResponse({'is_success': True,
+                         'items': [{'id': project.pk,
+                                    'title': project.title,
+                                    'description': project.description,
+                                    'url': reverse_lazy('project_detail', kwargs={'pk': project.pk})}
+                                   for project in projects],
+                         'next_cursor': next_cursor})
 
 # Получение конкретного проекта
+# Проект с общим временем, первая страница задач и программы со своим временем загружаются
+# фиксированным числом запросов, разбивка времени на часы, минуты и секунды считается один раз
 class ProjectDetailView(LoginRequiredMixin, DetailView):
     template_name = 'projects/detail.html'
     model = Project
     def get_queryset(self):
-        return super().get_queryset().filter(user=self.request.user)
+        project_programs = ProjectProgram.objects.with_total_time().select_related('program')
+        return super().get_queryset().filter(user=self.request.user)\
+                                     .with_total_time()\
+                                     .prefetch_related(Prefetch('project_programs', queryset=project_programs))
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['tasks'], context['next_tasks_cursor'] = keyset_page(self.object.tasks.all())
+        context['total_time'] = self.object.get_hours_minutes_seconds()
+        context['program_times'] = [(project_program.program.name, project_program.get_hours_minutes_seconds())
+                                    for project_program in self.object.project_programs.all()]
+        return context
+
+# Ответ эндпоинтов таймера: новое состояние таймера и, по запросу (?fragment=1),
+# готовая разметка панели активного проекта, чтобы клиент обновил шапку без перезагрузки страницы
+def timer_state_response(request, **data):
+    invalidate_timer_state(request.user.pk)
+    state = get_timer_state(request.user, reload=True)
+    data['timer'] = {**state,
+                     'started_at': int(state['started_at'].timestamp()) if state['in_work'] else None}
+    if request.GET.get('fragment'):
+        data['header_html'] = render_to_string('projects/timer_panel.html',
+                                               {'timer': state}, request=request)
+    return JsonResponse({'is_success': True, **data})
+
+# Следующая страница задач проекта
+@login_required
+def tasks_page(request, pk):
+    queryset = Task.objects.filter(project_id=pk, project__user=request.user)
+    try:
+        tasks, next_cursor = keyset_page(queryset, request.GET.get('cursor'), TASKS_PAGE_SIZE)
+    except InvalidCursor:
+        return JsonResponse({'is_success': False,
+                             'error': 'Invalid cursor'}, status=400)
+    return JsonResponse({'is_success': True,
+                         'items': [{'id': task.pk, 'text': task.text, 'is_done': task.is_done}
+                                   for task in tasks],
+                         'next_cursor': next_cursor})
 
 # Активация проекта
 @require_POST
@@ -79,85 +180,218 @@ def project_activate(request):
         return JsonResponse({'error': 'Project not found'})
     active_project.project = project
     active_project.save()
+    invalidate_timer_state(request.user.pk)
+    publish_timer_state(active_project)
     return HttpResponseRedirect(reverse_lazy('project_detail', kwargs={'pk': project_id}))
 
 # Запуска активного проекта
 @require_POST
 @login_required
+@throttle('timer', key='user', json=True)
 def project_start(request):
     active_project = ActiveProject.objects.filter(user=request.user).first()
     if not active_project:
         return JsonResponse({'is_success': False, 
                              'error': 'Where is not active project'})
-    if active_project.in_work:
-        return JsonResponse({'is_success': False, 
-                             'error': 'Project is already started'})
     current_program_id = request.POST.get('current_program_id', '')
     current_program = WorkProgram.objects.get(id=current_program_id) if current_program_id else None
-    active_project.current_program = current_program
-    active_project.in_work = True
-    active_project.save()
-    return JsonResponse({'is_success': True})
+    try:
+        start_timer(active_project, current_program)
+    except TimerError as error:
+        return JsonResponse({'is_success': False,
+                             'error': str(error)})
+    return timer_state_response(request)
 
 # Остановка активного проекта
 @require_POST
 @login_required
+@throttle('timer', key='user', json=True)
 def project_stop(request):
     active_project = ActiveProject.objects.filter(user=request.user).first()
-    if not active_project or not active_project.project:
+    if not active_project:
         return JsonResponse({'is_success': False, 
                              'error': 'Where is not active project'})
-    if not active_project.in_work:
-        return JsonResponse({'is_success': False, 
-                             'error': 'Project is already stopped'})
-    duration = timezone.now() - active_project.last_started_at
-    active_project.in_work = False
-    active_project.project.total_time += duration
-    active_project.save()
-    active_project.project.save()
-    print(active_project.in_work)
-    if active_project.current_program:
-        project_program, _ = ProjectProgram.objects.get_or_create(program=active_project.current_program,
-                                                                  project=active_project.project)
-        project_program.total_time += duration
-        project_program.save()
-    return JsonResponse({'is_success': True})
+    try:
+        stop_timer(active_project)
+    except TimerError as error:
+        return JsonResponse({'is_success': False,
+                             'error': str(error)})
+    return timer_state_response(request)
+
+# Синхронизация пакета событий таймера, накопленных на клиенте
+# Тело запроса: {"events": [{"id": "...", "type": "start|stop|switch", "at": <мс с начала эпохи>, "program_id": ...}]}
+# События применяются по возрастанию времени в одной транзакции, повторно присланные отбрасываются
+@require_POST
+@login_required
+@throttle('timer', key='user', json=True)
+def timer_sync(request):
+    try:
+        events = json.loads(request.body)['events']
+        events = [{'id': timer_event_id(event['id']),
+                   'type': event['type'],
+                   'at': datetime.fromtimestamp(int(event['at']) / 1000, tz=dt_timezone.utc),
+                   'program_id': int(event['program_id']) if event.get('program_id') else None}
+                  for event in events]
+        if any(event['type'] not in TIMER_EVENT_TYPES for event in events):
+            raise ValueError('Unknown event type')
+    except (ValueError, KeyError, TypeError, OverflowError):
+        return JsonResponse({'is_success': False,
+                             'error': 'Invalid events'}, status=400)
+    if len(events) > TIMER_SYNC_MAX_EVENTS:
+        return JsonResponse({'is_success': False,
+                             'error': 'Too many events'}, status=400)
+    events.sort(key=lambda event: event['at'])
+    # Учитывать время можно только в своих программах
+    program_ids = {event['program_id'] for event in events if event['program_id']}
+    programs = request.user.work_programs.in_bulk(program_ids)
+    if len(programs) != len(program_ids):
+        return JsonResponse({'is_success': False,
+                             'error': 'Unknown program'}, status=400)
+    now = timezone.now()
+
+    results = []
+    processed = []
+    with transaction.atomic():
+        active_project = ActiveProject.objects.select_for_update().filter(user=request.user).first()
+        known_ids = set(TimerEvent.objects.filter(user=request.user,
+                                                  client_id__in=[event['id'] for event in events])
+                                          .values_list('client_id', flat=True))
+        last_at = TimerEvent.objects.filter(user=request.user, is_applied=True)\
+                                    .aggregate(last_at=Max('occurred_at'))['last_at']
+        for event in events:
+            if event['id'] in known_ids:
+                results.append({'id': event['id'], 'status': 'duplicate'})
+                continue
+            known_ids.add(event['id'])
+            program = programs.get(event['program_id'])
+            error = None
+            if event['at'] > now + TIMER_SYNC_CLOCK_SKEW:
+                error = 'Event is in the future'
+            elif last_at and event['at'] < last_at:
+                error = 'Event is older than the last applied event'
+            elif not active_project:
+                error = 'Where is not active project'
+            else:
+                try:
+                    if event['type'] == 'start':
+                        start_timer(active_project, program, event['at'])
+                    elif event['type'] == 'stop':
+                        stop_timer(active_project, event['at'])
+                    else:
+                        switch_program(active_project, program, event['at'])
+                except TimerError as timer_error:
+                    error = str(timer_error)
+            if error is None:
+                last_at = event['at']
+                results.append({'id': event['id'], 'status': 'applied'})
+            else:
+                results.append({'id': event['id'], 'status': 'rejected', 'error': error})
+            processed.append(TimerEvent(user=request.user,
+                                        client_id=event['id'],
+                                        kind=event['type'],
+                                        program=program,
+                                        occurred_at=event['at'],
+                                        is_applied=error is None))
+        TimerEvent.objects.bulk_create(processed)
+    return timer_state_response(request, results=results)
+
+
+# Архивация проектов пользователя
+# Проверка владельца выполняется в самом UPDATE, активный проект из архивируемых снимается с активного состояния
+# (идущая по нему сессия предварительно сохраняется в журнал)
+def archive_projects(user, project_ids):
+    with transaction.atomic():
+        archived = Project.objects.filter(id__in=project_ids, user=user, is_archived=False)\
+                                  .update(is_archived=True)
+        active_project = ActiveProject.objects.select_for_update()\
+                                              .filter(user=user, project_id__in=project_ids).first()
+        if active_project:
+            if active_project.in_work:
+                stop_timer(active_project)
+            ActiveProject.objects.filter(pk=active_project.pk).update(project=None,
+                                                                     current_program=None,
+                                                                     in_work=False)
+            active_project.project = None
+            active_project.current_program = None
+            transaction.on_commit(lambda: invalidate_timer_state(user.pk))
+            publish_timer_state(active_project)
+        # Кэш сбрасывается после фиксации: до нее параллельный запрос снова закэшировал бы старые данные
+        # (в batch_update эта транзакция вложенная, и сброс откладывается до конца внешней)
+        # UPDATE не отправляет post_save, поэтому меню проектов (project_changed) сбрасывается здесь же
+        transaction.on_commit(lambda: invalidate_page_chrome(user.pk))
+        transaction.on_commit(lambda: invalidate_user_data(user.pk))
+    return archived
 
 # Архивация проекта
 # Исправлен баг (при архивации активного проекта он не снимался с активного состояния)
 @require_POST
 @login_required
 def project_archive(request, id):
-    try:
-        project = Project.objects.get(id=id, user=request.user)
-        # Проверяем, не является ли проект активным
-        try:
-            active_project = ActiveProject.objects.get(user=request.user)
-            if active_project.project == project:
-                # Сбрасываем активный проект
-                active_project.project = None
-                active_project.current_program = None
-                active_project.in_work = False
-                active_project.save()
-        except ActiveProject.DoesNotExist:
-            pass
-
-        project = Project.objects.get(id=id, user=request.user)
-        project.is_archived = True
-        project.save()
-        return HttpResponseRedirect(reverse_lazy('project_detail', kwargs={'pk': id}))
-    except Project.DoesNotExist:
-        return HttpResponseRedirect(reverse_lazy('project_detail', kwargs={'pk': id}))
+    archive_projects(request.user, [id])
+    return HttpResponseRedirect(reverse_lazy('project_detail', kwargs={'pk': id}))
 
-# Изменение статуса задачи
+# Изменение статуса задачи (одним UPDATE с проверкой владельца)
 @require_POST
 @login_required
 def change_task_status(request, id):
+    updated = Task.objects.filter(id=id, project__user=request.user).update(
+        is_done=Case(When(is_done=True, then=Value(False)), default=Value(True))
+    )
+    if not updated:
+        return JsonResponse({'is_success': False,
+                             'error': 'Task not found'})
+    invalidate_user_data(request.user.pk)
+    return JsonResponse({'is_success': True})
+
+# Пакетное изменение задач и проектов
+# Тело запроса: {"tasks": [{"id": 1, "is_done": true}, ...], "archive": [id, ...], "activate": id}
+# Все изменения выполняются несколькими UPDATE ... WHERE id IN (...) в одной транзакции,
+# объекты, не принадлежащие пользователю, просто не попадают под условие
+@require_POST
+@login_required
+def batch_update(request):
     try:
-        task = Task.objects.get(id=id, project__user=request.user)
-        task.is_done = not task.is_done
-        task.save()
-        return JsonResponse({'is_success': True})
-    except Task.DoesNotExist:
+        payload = json.loads(request.body)
+        tasks = {int(task['id']): task['is_done'] for task in payload.get('tasks', [])}
+        # Строка "false" или число не превращаются в статус молча: это ошибка клиента
+        if not all(isinstance(is_done, bool) for is_done in tasks.values()):
+            raise ValueError('is_done must be a boolean')
+        archive_ids = [int(project_id) for project_id in payload.get('archive', [])]
+        activate_id = int(payload['activate']) if payload.get('activate') else None
+    except (ValueError, KeyError, TypeError, AttributeError):
         return JsonResponse({'is_success': False,
-                             'error': 'Task not found'})
\ No newline at end of file
+                             'error': 'Invalid payload'}, status=400)
+    done_ids = [task_id for task_id, is_done in tasks.items() if is_done]
+    undone_ids = [task_id for task_id, is_done in tasks.items() if not is_done]
+    user_tasks = Task.objects.filter(project__user=request.user)
+    user_id = request.user.pk
+
+    # Кэш таймера и отчетов сбрасывается только после фиксации транзакции
+    with transaction.atomic():
+        tasks_updated = 0
+        if done_ids:
+            tasks_updated += user_tasks.filter(id__in=done_ids).update(is_done=True)
+        if undone_ids:
+            tasks_updated += user_tasks.filter(id__in=undone_ids).update(is_done=False)
+        archived = archive_projects(request.user, archive_ids) if archive_ids else 0
+        activated = False
+        project = Project.objects.filter(id=activate_id, user=request.user, is_archived=False).first() \
+            if activate_id else None
+        if project:
+            # Идущая сессия по прежнему проекту сначала сохраняется в журнал, иначе ее время пропало бы,
+            # а остаток записался бы на новый проект; UPDATE не трогает last_started_at (auto_now)
+            active_project, _ = ActiveProject.objects.select_for_update().get_or_create(user=request.user)
+            if active_project.project_id != project.pk:
+                if active_project.in_work:
+                    stop_timer(active_project)
+                ActiveProject.objects.filter(pk=active_project.pk).update(project=project)
+                active_project.project = project
+            activated = True
+            transaction.on_commit(lambda: invalidate_timer_state(user_id))
+            publish_timer_state(active_project)
+        if tasks_updated:
+            transaction.on_commit(lambda: invalidate_user_data(user_id))
+    return JsonResponse({'is_success': True,
+                         'tasks_updated': tasks_updated,
+                         'archived': archived,
+                         'activated': activated})
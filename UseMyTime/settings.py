@@ -26,6 +26,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Метрики (metrics.py) собираются первым слоем, чтобы учитывались запросы к базе всех остальных
+    'metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -47,6 +49,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'projects.context_processors.timer',
+                'projects.context_processors.page_chrome',
             ],
         },
     },
@@ -70,6 +74,67 @@ DATABASES = {
 #     }
 # }
 
+# Кэш (состояние таймеров и другие данные для отрисовки страниц)
+# Локальная память процесса подходит для одного воркера gunicorn,
+# при нескольких воркерах нужен общий кэш, например файловый (закомментирован ниже)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'usemytime',
+    }
+}
+
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#         'LOCATION': BASE_DIR / 'cache',
+#     }
+# }
+
+# Ограничение частоты запросов (accounts/throttling.py): имя ограничения -> "число/период" (s, m, h, d)
+# Ведра хранятся в кэше: для общего ограничения на несколько процессов нужен общий кэш (Redis, Memcached)
+THROTTLE_RATES = {
+    'login': '20/m',
+    'login_username': '5/m',
+    'password_reset': '5/h',
+    'password_reset_email': '3/h',
+    'ask': '5/m',
+    'timer': '30/m',
+}
+# Число доверенных прокси перед приложением (IP клиента берется из X-Forwarded-For)
+# 0 - IP клиента берется из REMOTE_ADDR. За обратным прокси (nginx) это адрес самого прокси,
+# и все клиенты попадают в одно ведро: одного активного клиента хватит, чтобы ограничение
+# сработало для всех. При развертывании за прокси задайте переменную окружения THROTTLE_PROXY_COUNT
+# (обычно 1) и убедитесь, что прокси дописывает адрес клиента в X-Forwarded-For
+THROTTLE_PROXY_COUNT = int(os.environ.get('THROTTLE_PROXY_COUNT', 0))
+
+# Метрики для Prometheus (эндпоинт /metrics/, только для сотрудников)
+# Каждый процесс сбрасывает свои метрики в файл каталога METRICS_DIR не чаще METRICS_FLUSH_INTERVAL секунд,
+# эндпоинт суммирует файлы всех процессов (в том числе обработчика очереди PDF-отчетов)
+# По умолчанию каталог не задан и эндпоинт отдает метрики только обслужившего его процесса;
+# при нескольких процессах задайте переменную окружения METRICS_DIR (каталог вне исходников, например /var/lib/usemytime/metrics)
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 10
+# Запросы к базе дольше этого порога (в секундах) пишутся в журнал usemytime.slow_queries, None - не писать
+SLOW_QUERY_THRESHOLD = 0.5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'usemytime.slow_queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -112,12 +177,15 @@ EMAIL_PORT = 465
 EMAIL_USE_SSL = True
 EMAIL_USE_TLS = False
     
+# Вход по логину или почте одним запросом и одной проверкой пароля
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
-    'accounts.authentication.EmailAuthBackend',
+    'accounts.authentication.UsernameOrEmailBackend',
 ]
 
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Готовые PDF-отчеты фоновой очереди (вне MEDIA_ROOT, выдаются только владельцу)
+REPORTS_ROOT = BASE_DIR / 'reports'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
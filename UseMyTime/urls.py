@@ -3,6 +3,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import TemplateView
+from metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,6 +11,7 @@ urlpatterns = [
     path('contacts/', include('contacts.urls')),
     path('programs/', include('work_programs.urls')),
     path('projects/', include('projects.urls')),
+    path('metrics/', metrics_view, name='metrics'),
     path('', TemplateView.as_view(template_name='index.html'), name='index')
 ]
 